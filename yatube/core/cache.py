@@ -0,0 +1,230 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core import holes
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Текущая версия набора кешей name.
+
+    Начальная версия берется от текущего времени: если ключ вытеснят из
+    кеша, новая версия не совпадет ни с одной из уже использованных.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Делает устаревшими все кеши, построенные на версии name."""
+    try:
+        cache.incr(_version_key(name))
+    except ValueError:
+        get_version(name)
+
+
+STAT_KINDS = ('hit', 'miss', 'wait', 'stale', 'refresh', 'early')
+# Как часто проверять, не появилось ли значение, которое считает
+# другой процесс
+_WAIT_STEP = 0.05
+# Имена кешей fetch, для которых ведется статистика
+names = set()
+
+
+def _count(name, kind):
+    key = f'cache_stats:{name}:{kind}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats(name):
+    """Счетчики кеша name: hit - свежее значение, miss - значения нет,
+    wait - значения не было, дождались его от другого процесса,
+    stale - отдано устаревшее, пока его пересчитывает другой процесс,
+    refresh - пересчет устаревшего, early - досрочный пересчет."""
+    values = cache.get_many([f'cache_stats:{name}:{kind}'
+                             for kind in STAT_KINDS])
+    return {kind: values.get(f'cache_stats:{name}:{kind}', 0)
+            for kind in STAT_KINDS}
+
+
+def _store(key, version, timeout, compute):
+    started = time.perf_counter()
+    value = compute()
+    if value is not None:
+        cache.set(key, {
+            'value': value,
+            'version': version,
+            'expires': time.time() + timeout,
+            'delta': time.perf_counter() - started,
+        }, timeout + settings.CACHE_STALE_TIMEOUT)
+    return value
+
+
+def _early(entry, now):
+    """Вероятностный досрочный пересчет (XFetch): чем ближе истечение
+    и чем дольше считается значение, тем вероятнее пересчет, поэтому
+    к моменту истечения значение обычно уже обновлено одним процессом."""
+    return (now - entry['delta'] * settings.CACHE_EARLY_BETA
+            * math.log(1 - random.random())) >= entry['expires']
+
+
+def _wait(key, lock):
+    """Ждет до CACHE_LOCK_WAIT секунд значение, которое считает
+    взявший блокировку процесс. None, если не дождались или блокировку
+    сняли без значения (его нельзя кешировать)."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(_WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(lock) is None:
+            return None
+    return None
+
+
+def _locked_store(key, lock, version, timeout, compute):
+    try:
+        return _store(key, version, timeout, compute)
+    finally:
+        cache.delete(lock)
+
+
+def fetch(name, key, version, timeout, compute, on_stale=None):
+    """Значение из кеша с stale-while-revalidate.
+
+    Устаревшее значение (истек timeout или сменилась версия) еще
+    CACHE_STALE_TIMEOUT секунд лежит в кеше. Пересчитывает его тот, кто
+    первым взял блокировку cache.add, остальные в это время получают
+    устаревшее значение и не ждут; перед отдачей устаревшего
+    вызывается on_stale(). Если значения нет совсем, остальные ждут
+    его до CACHE_LOCK_WAIT секунд и только потом считают сами.
+    compute() возвращает None для значений, которые кешировать нельзя.
+    """
+    names.add(name)
+    now = time.time()
+    entry = cache.get(key)
+    lock = f'{key}:lock'
+    if entry is None:
+        if cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+            _count(name, 'miss')
+            return _locked_store(key, lock, version, timeout, compute)
+        entry = _wait(key, lock)
+        if entry is None:
+            _count(name, 'miss')
+            return _store(key, version, timeout, compute)
+        _count(name, 'wait')
+        return entry['value']
+    fresh = entry['version'] == version and now < entry['expires']
+    if fresh and not _early(entry, now):
+        _count(name, 'hit')
+        return entry['value']
+    if not cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+        _count(name, 'hit' if fresh else 'stale')
+        if not fresh and on_stale is not None:
+            on_stale()
+        return entry['value']
+    _count(name, 'early' if fresh else 'refresh')
+    return _locked_store(key, lock, version, timeout, compute)
+
+
+def cache_shell(timeout, key_prefix, version):
+    """Кеширует общую для всех пользователей часть страницы.
+
+    View рендерится с request.shell = True: теги {% hole %} оставляют
+    метки вместо персональных фрагментов. Закешированная страница одна
+    на URL для анонимов и вошедших, метки заполняются на каждый запрос
+    (core.holes.fill). Хранение - через fetch, поэтому истечение и
+    bump_version не вызывают одновременного рендеринга во всех
+    процессах. Шаблон может сбросить request.shell_cacheable, если
+    страница временная (например, с заглушкой вместо миниатюры) -
+    тогда она отдается без кеширования. Такая страница, как и
+    устаревшая, помечается response.temporary (см. shell_condition).
+    """
+    names.add(key_prefix)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            uncached = []
+
+            def render():
+                request.shell = True
+                request.shell_cacheable = True
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    request.shell = False
+                if response.streaming or response.status_code != 200:
+                    uncached.append(response)
+                    return None
+                shell = (response.content.decode(response.charset),
+                         response['Content-Type'])
+                if not request.shell_cacheable:
+                    uncached.append(shell)
+                    return None
+                return shell
+
+            temporary = []
+            shell = fetch(key_prefix, f'shell:{key_prefix}:{path}',
+                          get_version(version), timeout, render,
+                          on_stale=lambda: temporary.append(True))
+            if shell is None:
+                shell = uncached[0]
+                if not isinstance(shell, tuple):
+                    return shell
+                temporary.append(True)
+            content, content_type = shell
+            response = HttpResponse(holes.fill(request, content),
+                                    content_type=content_type)
+            response.temporary = bool(temporary)
+            return response
+        return wrapper
+    return decorator
+
+
+def shell_condition(etag_func):
+    """condition(etag_func=...) для view под cache_shell.
+
+    ETag считается по текущей версии, а устаревшая страница собрана по
+    прежней: запомнив ее под новым ETag, клиент получал бы 304 на
+    старое содержимое. То же со страницей, которую не кешировали как
+    временную: заглушка миниатюры сменится без смены версии. Поэтому
+    такие страницы (response.temporary) отдаются без ETag и с
+    Cache-Control: no-store.
+    """
+    def decorator(view):
+        conditional = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if getattr(response, 'temporary', False):
+                del response['ETag']
+                patch_cache_control(response, no_store=True)
+            return response
+        return wrapper
+    return decorator
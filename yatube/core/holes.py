@@ -0,0 +1,39 @@
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+# Персональные фрагменты страниц ("дырки"). Общая для всех часть
+# страницы кешируется с метками вместо них, а сами фрагменты
+# рендерятся на каждый запрос: имя -> (шаблон, функция контекста)
+_registry = {}
+MARKER = re.compile(r'<!--hole:(\w+):([\w=-]*)-->')
+
+
+def register(name, template, context=None):
+    """Регистрирует фрагмент. context(request, **args) возвращает
+    дополнительный контекст шаблона."""
+    _registry[name] = (template, context)
+
+
+def render(request, name, args):
+    template, context = _registry[name]
+    data = dict(args)
+    if context is not None:
+        data.update(context(request, **args))
+    return render_to_string(template, data, request)
+
+
+def marker(name, args):
+    """Метка фрагмента. Аргументы должны сериализоваться в JSON."""
+    raw = base64.urlsafe_b64encode(json.dumps(args).encode()).decode()
+    return f'<!--hole:{name}:{raw}-->'
+
+
+def fill(request, content):
+    """Заменяет метки в закешированной странице фрагментами для request."""
+    def replace(match):
+        args = json.loads(base64.urlsafe_b64decode(match.group(2)))
+        return render(request, match.group(1), args)
+    return MARKER.sub(replace, content)
@@ -0,0 +1,155 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+from core import routers
+
+logger = logging.getLogger('core.profiling')
+
+# Глубина вложенности и время рендеринга шаблонов текущего потока
+_templates = threading.local()
+
+
+class QueryTimer:
+    """Считает запросы и их время через connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        depth = getattr(_templates, 'depth', None)
+        if depth is None:
+            return render(self, context, request)
+        # Вложенный render (например, render_to_string в теге) уже
+        # входит во время внешнего шаблона
+        _templates.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            _templates.depth = depth
+            if depth == 0:
+                _templates.seconds += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+def _profile_path(request):
+    name = request.path.strip('/').replace('/', '-') or 'index'
+    return os.path.join(
+        settings.PROFILING_DIR,
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{name}-'
+        f'{threading.get_ident()}.prof',
+    )
+
+
+class ProfilingMiddleware:
+    """Замеряет SQL, рендеринг шаблонов, остальной Python и общее время.
+
+    Результат отдается в заголовке Server-Timing и строкой JSON в логгер
+    core.profiling. Доля PROFILING_SAMPLE_RATE запросов дополнительно
+    профилируется cProfile, дампы пишутся в PROFILING_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        profiler = None
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+        _templates.depth, _templates.seconds = 0, 0.0
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                if profiler is not None:
+                    try:
+                        profiler.enable()
+                    except ValueError:
+                        # В потоке уже работает другой профилировщик
+                        profiler = None
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            template_seconds = _templates.seconds
+            del _templates.depth
+        total = time.perf_counter() - started
+        metrics = {
+            'sql': timer.seconds * 1000,
+            'tpl': template_seconds * 1000,
+            # Все остальное: код view, middleware, сериализация
+            'app': max(total - timer.seconds - template_seconds, 0) * 1000,
+            'total': total * 1000,
+        }
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={metrics["sql"]:.2f};desc="{timer.count} queries"',
+            f'tpl;dur={metrics["tpl"]:.2f}',
+            f'app;dur={metrics["app"]:.2f}',
+            f'total;dur={metrics["total"]:.2f}',
+        ])
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timer.count,
+        }
+        record.update(
+            (f'{name}_ms', round(value, 2)) for name, value in metrics.items()
+        )
+        if profiler is not None:
+            os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+            record['profile'] = _profile_path(request)
+            profiler.dump_stats(record['profile'])
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class StickyPrimaryMiddleware:
+    """Отмечает в сессии время запроса, который писал в базу.
+
+    Следующие REPLICA_STICKY_SECONDS секунд read_from_replica отправляет
+    чтение этого пользователя в основную базу.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.mark_clean()
+        response = self.get_response(request)
+        if routers.written():
+            request.session[routers.STICKY_KEY] = time.time()
+        return response
@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# Когда пользователь последний раз писал в базу, ключ сессии
+STICKY_KEY = '_db_written_at'
+
+# Реплика, выбранная для текущего запроса, и была ли в нем запись
+_state = threading.local()
+
+
+def mark_clean():
+    _state.written = False
+
+
+def written():
+    return getattr(_state, 'written', False)
+
+
+def is_sticky(request):
+    """Недавно писавший пользователь читает с основной базы, пока
+    реплики не догнали его изменения."""
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    written_at = session.get(STICKY_KEY, 0)
+    return time.time() - written_at < settings.REPLICA_STICKY_SECONDS
+
+
+class PrimaryReplicaRouter:
+    """Запись всегда в основную базу, чтение - в реплику только внутри
+    view с декоратором read_from_replica.
+
+    После первой записи в запросе чтение до его конца тоже идет в
+    основную базу. Сессии читаются только из основной базы: иначе
+    отставание реплики выкидывает пользователя сразу после входа.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica is None or written() or model._meta.app_label == 'sessions':
+            return PRIMARY
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+
+def read_from_replica(view):
+    """Выполняет view с чтением из случайной реплики из
+    DATABASE_REPLICAS, если у пользователя не истекло окно после записи."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or is_sticky(request):
+            return view(request, *args, **kwargs)
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = None
+    return wrapper
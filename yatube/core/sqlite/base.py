@@ -0,0 +1,46 @@
+from django.db.backends.sqlite3 import base
+
+# Значения по умолчанию; переопределяются через OPTIONS['pragmas']
+PRAGMAS = {
+    # Первым: остальные PRAGMA тоже могут ждать блокировку
+    'busy_timeout': 5000,
+    # Читатели не ждут писателя, писатель не ждет читателей
+    'journal_mode': 'WAL',
+    # В режиме WAL fsync только на контрольной точке, не на каждый commit
+    'synchronous': 'NORMAL',
+    # Отрицательное значение - размер в КиБ: 64 МиБ страничного кеша
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """sqlite3 с WAL и настроенными PRAGMA на каждом соединении.
+
+    OPTIONS['pragmas'] дополняет PRAGMAS, OPTIONS['transaction_mode']
+    задает вид BEGIN для transaction.atomic. IMMEDIATE берет блокировку
+    записи в начале транзакции: иначе транзакция, начавшаяся с чтения,
+    при первой записи сразу получает "database is locked", если другой
+    писатель успел закоммитить, и busy_timeout тут не помогает.
+    """
+    pragmas = PRAGMAS
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
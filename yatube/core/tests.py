@@ -1,6 +1,24 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
 from http import HTTPStatus
 
-from django.test import Client, TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, router
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from core import cache as core_cache
+from core.middleware import QueryTimer
+from core.sqlite.base import DatabaseWrapper
+from posts.models import Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -15,3 +33,247 @@ class ViewTestClass(TestCase):
         response = ViewTestClass.client.get('/unexisting_page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(SERVER_TIMING=True)
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит время SQL, шаблонов и общее время"""
+        with self.assertLogs('core.profiling', level='INFO') as logs:
+            response = Client().get('/')
+        timing = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'app;dur=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/')
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['tpl_ms'], 0)
+
+    def test_sampled_requests_are_profiled(self):
+        """При PROFILING_SAMPLE_RATE=1 каждый запрос пишет дамп cProfile"""
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(PROFILING_SAMPLE_RATE=1,
+                               PROFILING_DIR=directory):
+                with self.assertLogs('core.profiling', level='INFO'):
+                    Client().get('/')
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled_by_default(self):
+        """Без SERVER_TIMING заголовок не добавляется"""
+        response = Client().get('/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class SqliteBackendTest(SimpleTestCase):
+    def open(self, path, **pragmas):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': path,
+            'OPTIONS': {'pragmas': {'busy_timeout': 10, **pragmas}},
+        })
+        self.addCleanup(wrapper.close)
+        return wrapper.cursor()
+
+    def read_while_writing(self, **pragmas):
+        """Число успешных чтений, пока другое соединение держит запись"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'db.sqlite3')
+            writer = self.open(path, **pragmas)
+            writer.execute('CREATE TABLE item (id integer PRIMARY KEY)')
+            writer.execute('INSERT INTO item VALUES (1)')
+            reader = self.open(path, **pragmas)
+            writer.execute('BEGIN EXCLUSIVE')
+            writer.execute('INSERT INTO item VALUES (2)')
+            reads = 0
+            for _ in range(20):
+                try:
+                    reader.execute('SELECT count(*) FROM item')
+                except OperationalError:
+                    continue
+                self.assertEqual(reader.fetchone()[0], 1)
+                reads += 1
+            writer.execute('COMMIT')
+            return reads
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает WAL и остальные PRAGMA"""
+        with tempfile.TemporaryDirectory() as directory:
+            cursor = self.open(os.path.join(directory, 'db.sqlite3'))
+            for name, expected in (('journal_mode', 'wal'),
+                                   ('synchronous', 1),
+                                   ('cache_size', -64000),
+                                   ('busy_timeout', 10)):
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_readers_not_blocked_by_writer(self):
+        """В WAL чтения идут во время записи, в rollback-журнале - нет"""
+        self.assertEqual(self.read_while_writing(), 20)
+        self.assertEqual(self.read_while_writing(journal_mode='DELETE'), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client.force_login(self.user)
+
+    def queries(self, url, method='get', data=None):
+        """Число запросов к каждой базе за один запрос к url"""
+        timers = {alias: QueryTimer() for alias in ('default', 'replica')}
+        with ExitStack() as stack:
+            for alias, timer in timers.items():
+                stack.enter_context(connections[alias].execute_wrapper(timer))
+            getattr(self.client, method)(url, data)
+        return {alias: timer.count for alias, timer in timers.items()}
+
+    def test_feed_reads_from_replica(self):
+        """Ленты читаются с реплики"""
+        queries = self.queries(reverse('posts:index'))
+        self.assertGreater(queries['replica'], 0)
+
+    def test_write_sticks_to_primary(self):
+        """После записи чтение идет в основную базу до конца окна"""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        self.queries(reverse('posts:add_comment', args=(self.post.id,)),
+                     'post', {'text': 'Комментарий'})
+        self.assertEqual(self.queries(url)['replica'], 0)
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.assertGreater(self.queries(url)['replica'], 0)
+
+    def test_search_reads_from_replica(self):
+        """Полнотекстовый поиск идет в реплику вместе с лентами"""
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connections['replica'].execute_wrapper(record):
+            response = self.client.get(reverse('posts:search'),
+                                       {'q': 'Пост'})
+        self.assertEqual(response.context['page_obj'][0], self.post)
+        self.assertTrue([sql for sql in statements
+                         if 'posts_post_fts' in sql])
+
+    def test_reads_outside_decorated_views_use_primary(self):
+        """Без read_from_replica router оставляет чтение в основной базе"""
+        self.assertEqual(router.db_for_read(Post), 'default')
+        queries = self.queries(reverse('posts:post_edit',
+                                       args=(self.post.id,)))
+        self.assertEqual(queries['replica'], 0)
+
+
+class StaleWhileRevalidateTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def fetch(self, version=1):
+        return core_cache.fetch('test', 'test:key', version, 60, self.compute)
+
+    def expire(self):
+        entry = cache.get('test:key')
+        entry['expires'] = time.time() - 1
+        cache.set('test:key', entry)
+
+    def test_miss_then_hit(self):
+        """Значение считается один раз, дальше берется из кеша"""
+        self.assertEqual(self.fetch(), 'значение 1')
+        self.assertEqual(self.fetch(), 'значение 1')
+        self.assertEqual(core_cache.stats('test'),
+                         {'hit': 1, 'miss': 1, 'wait': 0, 'stale': 0,
+                          'refresh': 0, 'early': 0})
+
+    def later(self, action):
+        timer = threading.Timer(0.1, action)
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_miss_waits_for_lock_owner(self):
+        """При пустом кеше значение считает только взявший блокировку,
+        остальные его ждут"""
+        cache.add('test:key:lock', 1)
+        self.later(lambda: core_cache._store('test:key', 1, 60,
+                                             lambda: 'чужое'))
+        self.assertEqual(self.fetch(), 'чужое')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(core_cache.stats('test')['wait'], 1)
+
+    def test_miss_computed_without_lock_owner_value(self):
+        """Не дождавшись значения или после снятия блокировки без него
+        процесс считает сам"""
+        cache.add('test:key:lock', 1)
+        self.later(lambda: cache.delete('test:key:lock'))
+        self.assertEqual(self.fetch(), 'значение 1')
+        cache.clear()
+        cache.add('test:key:lock', 1)
+        with self.settings(CACHE_LOCK_WAIT=0.1):
+            self.assertEqual(self.fetch(), 'значение 2')
+        self.assertEqual(core_cache.stats('test')['wait'], 0)
+
+    def test_stale_served_while_locked(self):
+        """Пока другой процесс держит блокировку, отдается устаревшее"""
+        self.fetch()
+        self.expire()
+        cache.add('test:key:lock', 1)
+        served = []
+        self.assertEqual(self.fetch(), 'значение 1')
+        self.assertEqual(
+            core_cache.fetch('test', 'test:key', 2, 60, self.compute,
+                             on_stale=lambda: served.append(True)),
+            'значение 1',
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(served, [True])
+        self.assertEqual(core_cache.stats('test')['stale'], 2)
+
+    def test_stale_refreshed_by_lock_owner(self):
+        """Истечение и смена версии пересчитываются взявшим блокировку"""
+        self.fetch()
+        self.expire()
+        self.assertEqual(self.fetch(), 'значение 2')
+        self.assertEqual(self.fetch(version=2), 'значение 3')
+        self.assertEqual(core_cache.stats('test')['refresh'], 2)
+        self.assertIsNone(cache.get('test:key:lock'))
+
+    def test_early_refresh(self):
+        """С большим CACHE_EARLY_BETA свежее значение пересчитывается
+        досрочно, с нулевым - никогда"""
+        self.fetch()
+        entry = cache.get('test:key')
+        entry['delta'] = 1
+        cache.set('test:key', entry)
+        with self.settings(CACHE_EARLY_BETA=0):
+            self.assertEqual(self.fetch(), 'значение 1')
+        with self.settings(CACHE_EARLY_BETA=10 ** 6):
+            self.assertEqual(self.fetch(), 'значение 2')
+        self.assertEqual(core_cache.stats('test')['early'], 1)
+
+
+class CacheStatsViewTest(TestCase):
+    def test_stats_for_staff_only(self):
+        """Счетчики страниц видны только персоналу"""
+        cache.clear()
+        Client().get('/')
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client = Client()
+        self.assertEqual(client.get(reverse('cache_stats')).status_code,
+                         HTTPStatus.FOUND)
+        client.force_login(staff)
+        stats = client.get(reverse('cache_stats')).json()
+        self.assertEqual(stats['index_page']['miss'], 1)
@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core import cache
+
 
 def page_not_found(request, exception):
     template = 'core/404.html'
@@ -20,3 +24,9 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse({name: cache.stats(name)
+                         for name in sorted(cache.names)})
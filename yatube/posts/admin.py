@@ -1,8 +1,30 @@
+from django.conf import settings
 from django.contrib import admin
+from django.forms.models import ModelChoiceField, ModelChoiceIterator
 
+from posts.includes.paginator import EstimatedCountPaginator
+from posts.includes.search import search
 from posts.models import Comment, Follow, Group, Post
 
 
+class SharedChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        shared = self.field.shared_choices
+        if 'choices' not in shared:
+            shared['choices'] = list(super().__iter__())
+        return iter(shared['choices'])
+
+
+class SharedModelChoiceField(ModelChoiceField):
+    """Варианты запрашиваются один раз на все строки list_editable."""
+    iterator = SharedChoiceIterator
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Копии поля в формах строк делят этот словарь
+        self.shared_choices = {}
+
+
 class PostAdmin(admin.ModelAdmin):
     list_display = (
         'id',
@@ -16,10 +38,29 @@ class PostAdmin(admin.ModelAdmin):
         'text',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author',)
     search_fields = ('text',)
+    # Без date_hierarchy: в Django 2.2 он строит список лет через
+    # DISTINCT по всей таблице. Ссылки фильтра по дате - диапазоны
+    # по индексу pub_date
     list_filter = ('pub_date',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['form_class'] = SharedModelChoiceField
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по FTS5-индексу вместо LIKE '%term%' по всей таблице
+        if not search_term:
+            return queryset, False
+        ids = search(search_term, settings.SEARCH_LIMIT)
+        return queryset.filter(id__in=ids), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -47,8 +88,12 @@ class CommentAdmin(admin.ModelAdmin):
         'id',
         'text',
     )
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -58,8 +103,11 @@ class FollowAdmin(admin.ModelAdmin):
         'user',
         'author',
     )
-    search_fields = ('user', 'author')
-    list_editable = ('user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
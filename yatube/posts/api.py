@@ -0,0 +1,172 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.http import JsonResponse, StreamingHttpResponse
+
+from core.routers import read_from_replica
+from posts.includes import groups
+from posts.includes.paginator import (OLDER, ORDER, CursorPaginator,
+                                      decode_cursor, encode_cursor)
+from posts.includes.timeline import posts_for
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+# Поле ответа -> путь для values(). Строки берутся из базы словарями,
+# экземпляры моделей не создаются
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated_at': 'updated_at',
+    'image': 'image',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+}
+# Сколько строк за раз читает iterator() при потоковой выдаче
+CHUNK_SIZE = 500
+
+
+def _error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def _fields(request, allowed):
+    """Поля из ?fields=a,b или все доступные."""
+    names = [name for name in request.GET.get('fields', '').split(',')
+             if name]
+    unknown = set(names) - set(allowed)
+    if unknown:
+        raise ValueError(
+            f'Неизвестные поля: {", ".join(sorted(unknown))}. '
+            f'Доступны: {", ".join(allowed)}'
+        )
+    return names or list(allowed)
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.PAGE_OBJ_COUNT))
+    except ValueError:
+        raise ValueError('limit должен быть числом')
+    if not 1 <= limit <= settings.API_MAX_LIMIT:
+        raise ValueError(f'limit от 1 до {settings.API_MAX_LIMIT}')
+    return limit
+
+
+def _serializer(fields, allowed):
+    paths = [(name, allowed[name]) for name in fields]
+
+    def serialize(row):
+        item = {name: row[path] for name, path in paths}
+        if 'image' in item:
+            item['image'] = (default_storage.url(item['image'])
+                             if item['image'] else None)
+        return item
+    return serialize
+
+
+def _stream(rows, limit, serialize):
+    """JSON страницы по частям: строки пишутся по мере чтения из базы,
+    курсор следующей страницы известен только в конце."""
+    yield '{"results": ['
+    last = next_cursor = None
+    for index, row in enumerate(rows):
+        if index == limit:
+            next_cursor = encode_cursor(OLDER, last)
+            break
+        if index:
+            yield ','
+        yield json.dumps(serialize(row), cls=DjangoJSONEncoder,
+                         ensure_ascii=False)
+        last = row
+    yield f'], "next": {json.dumps(next_cursor)}}}'
+
+
+def _page(request, queryset, allowed, order=ORDER):
+    """Страница ленты по курсору, отдаваемая потоком."""
+    try:
+        fields = _fields(request, allowed)
+        limit = _limit(request)
+    except ValueError as error:
+        return _error(str(error), 400)
+    cursor = request.GET.get('cursor')
+    position = decode_cursor(cursor) if cursor else None
+    # API отдает только курсоры к более старым записям
+    if cursor and (position is None or position[0] != OLDER):
+        return _error('Неверный курсор', 400)
+    ordered, _ = CursorPaginator(queryset, limit, order).ordered(position)
+    # Запрос выполнится уже после выхода из view, поэтому база
+    # выбирается сейчас, пока действует read_from_replica
+    rows = (
+        ordered.using(router.db_for_read(queryset.model))
+        .values(*{allowed[name] for name in fields}, 'id', 'pub_date')
+    )[:limit + 1]
+    return StreamingHttpResponse(
+        _stream(rows.iterator(chunk_size=CHUNK_SIZE), limit,
+                _serializer(fields, allowed)),
+        content_type='application/json',
+    )
+
+
+@read_from_replica
+def index(request):
+    return _page(request, Post.objects.all(), POST_FIELDS)
+
+
+@read_from_replica
+def group_posts(request, slug):
+    group = groups.by_slug(slug)
+    if group is None:
+        return _error('Группа не найдена', 404)
+    return _page(request, Post.objects.filter(group=group), POST_FIELDS)
+
+
+@read_from_replica
+def profile(request, username):
+    if not User.objects.filter(username=username).exists():
+        return _error('Автор не найден', 404)
+    return _page(request, Post.objects.filter(author__username=username),
+                 POST_FIELDS)
+
+
+@read_from_replica
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return _error('Требуется авторизация', 401)
+    post_list, order = posts_for(request.user)
+    return _page(request, post_list, POST_FIELDS, order)
+
+
+@read_from_replica
+def post_detail(request, post_id):
+    try:
+        fields = _fields(request, POST_FIELDS)
+    except ValueError as error:
+        return _error(str(error), 400)
+    row = Post.objects.filter(id=post_id).values(
+        *{POST_FIELDS[name] for name in fields}
+    ).first()
+    if row is None:
+        return _error('Пост не найден', 404)
+    return JsonResponse(_serializer(fields, POST_FIELDS)(row),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@read_from_replica
+def comments(request, post_id):
+    if not Post.objects.filter(id=post_id).exists():
+        return _error('Пост не найден', 404)
+    return _page(request, Comment.objects.filter(post_id=post_id),
+                 COMMENT_FIELDS)
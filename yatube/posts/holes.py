@@ -0,0 +1,25 @@
+from core import holes
+from posts.forms import CommentForm
+from posts.models import Follow
+
+
+def follow_context(request, author, author_id):
+    """author - имя для ссылок, подписка проверяется по author_id без
+    JOIN на таблицу пользователей."""
+    user = request.user
+    following = (
+        user.is_authenticated and user.pk != author_id
+        and Follow.objects.filter(user=user, author_id=author_id).exists()
+    )
+    return {'following': following}
+
+
+def comment_form_context(request, post_id):
+    return {'form': CommentForm()}
+
+
+holes.register('switcher', 'posts/includes/switcher.html')
+holes.register('follow', 'posts/includes/follow.html', follow_context)
+holes.register('post_edit', 'posts/includes/post_edit.html')
+holes.register('comment_form', 'posts/includes/comment_form.html',
+               comment_form_context)
@@ -0,0 +1,115 @@
+import math
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from core.middleware import QueryTimer
+from posts.includes.seed import seed
+from posts.models import Group, Post, UserCounter
+
+User = get_user_model()
+
+
+def dataset(size, seed_value=42):
+    """Наполняет текущую базу: size постов и пропорциональные им
+    пользователи, группы, комментарии и подписки."""
+    seed(
+        users=max(size // 10, 10),
+        groups=max(size // 1000, 5),
+        posts=size,
+        comments=size,
+        follows=size,
+        seed_value=seed_value,
+        now=timezone.now().replace(microsecond=0),
+        prefix='bench',
+    )
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+def _requests():
+    """(имя, метод, url, данные) для каждой проверяемой view."""
+    post = Post.objects.order_by('-comments_count').first()
+    author = User.objects.order_by('-counter__posts_count').first()
+    group = Group.objects.order_by('-posts_count').first()
+    return [
+        ('index', 'get', reverse('posts:index'), None),
+        ('group_posts', 'get',
+         reverse('posts:group_list', args=(group.slug,)), None),
+        ('profile', 'get', reverse('posts:profile', args=(author.username,)),
+         None),
+        ('post_detail', 'get', reverse('posts:post_detail', args=(post.id,)),
+         None),
+        ('follow_index', 'get', reverse('posts:follow_index'), None),
+        ('post_create', 'post', reverse('posts:post_create'),
+         {'text': 'Пост из бенчмарка'}),
+        ('add_comment', 'post', reverse('posts:add_comment', args=(post.id,)),
+         {'text': 'Комментарий из бенчмарка'}),
+    ]
+
+
+def measure(repeat, warm=False):
+    """Прогоняет каждую view repeat раз и собирает задержки и SQL."""
+    reader = (
+        UserCounter.objects.order_by('-following_count')
+        .values_list('user_id', flat=True)
+        .first()
+    )
+    client = Client()
+    client.force_login(User.objects.get(pk=reader))
+    results = {}
+    for name, method, url, data in _requests():
+        latencies, queries, sql_times = [], [], []
+        for _ in range(repeat):
+            if not warm:
+                cache.clear()
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name}: ответ {response.status_code}')
+            queries.append(timer.count)
+            sql_times.append(timer.seconds * 1000)
+        results[name] = {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(_percentile(latencies, 95), 3),
+            'queries': max(queries),
+            'sql_ms': round(statistics.median(sql_times), 3),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно сохраненного прогона.
+
+    Задержка p95 может вырасти не больше чем на tolerance (доля),
+    число запросов расти не должно вовсе.
+    """
+    regressions = []
+    for size, views in baseline.items():
+        for name, old in views.items():
+            new = results.get(size, {}).get(name)
+            if new is None:
+                continue
+            if new['queries'] > old['queries']:
+                regressions.append(
+                    f'{size}/{name}: запросов {old["queries"]} -> '
+                    f'{new["queries"]}'
+                )
+            if new['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f'{size}/{name}: p95 {old["p95_ms"]} -> '
+                    f'{new["p95_ms"]} мс'
+                )
+    return regressions
@@ -0,0 +1,53 @@
+import hashlib
+
+from core.cache import get_version
+from posts.includes import groups, thumbnails
+from posts.includes.feed import FEED_VERSION
+from posts.models import Post
+
+# ETag для условных GET. Считается без рендеринга: версия кешей лент
+# меняется при любой правке постов, групп, комментариев и подписок,
+# а последний пост ленты берется одним запросом по индексу
+# (pub_date, id). Пользователь входит в ETag, потому что шапка, кнопка
+# подписки и форма комментария у каждого свои.
+
+
+def _etag(request, *parts):
+    raw = '|'.join(
+        str(part)
+        for part in (get_version(FEED_VERSION), request.user.pk) + parts
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _latest(post_list):
+    return post_list.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id'
+    ).first()
+
+
+def index_etag(request):
+    return _etag(request, _latest(Post.objects.all()))
+
+
+def group_etag(request, slug):
+    group = groups.by_slug(slug)
+    if group is None:
+        return _etag(request, slug)
+    return _etag(request, slug, _latest(Post.objects.filter(group=group)))
+
+
+def profile_etag(request, username):
+    return _etag(
+        request, username,
+        _latest(Post.objects.filter(author__username=username)),
+    )
+
+
+def post_etag(request, post_id):
+    post = Post.objects.filter(id=post_id).order_by('pk').values_list(
+        'updated_at', 'comments_count', 'image'
+    ).first()
+    # Готовая миниатюра меняет страницу без записи в базу
+    thumbnail = post and post[2] and thumbnails.ready_url(post[2], 'card')
+    return _etag(request, post, thumbnail)
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from posts.models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+def _shift(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def change_user(user_id, **deltas):
+    """Сдвигает счетчики пользователя: change_user(1, posts_count=1)."""
+    updates = {field: _shift(field, delta) for field, delta in deltas.items()}
+    updated = UserCounter.objects.filter(user_id=user_id).update(**updates)
+    # Строки может не быть у пользователей, созданных в обход сигналов.
+    # При уменьшении ее не создаем: пользователь может удаляться каскадом.
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        UserCounter.objects.get_or_create(user_id=user_id)
+        UserCounter.objects.filter(user_id=user_id).update(**updates)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=_shift('posts_count', delta)
+        )
+
+
+def change_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shift('comments_count', delta)
+    )
+
+
+def _count(queryset, field):
+    """Подзапрос COUNT(*) по внешнему ключу field для OuterRef('pk')."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recount():
+    """Пересчитывает все счетчики по текущим данным."""
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=pk) for pk in
+         User.objects.filter(counter__isnull=True).values_list('pk',
+                                                               flat=True)],
+        batch_size=500,
+    )
+    UserCounter.objects.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    Group.objects.update(posts_count=_count(Post.objects.all(), 'group'))
+    Post.objects.update(comments_count=_count(Comment.objects.all(), 'post'))
@@ -0,0 +1,66 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Post
+
+# Колонки выгрузки: посты и комментарии идут в одном потоке,
+# kind различает строки, лишние для строки поля пустые
+COLUMNS = ('kind', 'id', 'pub_date', 'text', 'group', 'image', 'post')
+FORMATS = ('ndjson', 'csv')
+CHUNK_SIZE = 2000
+
+
+def rows(author_id, comments=False, using=None):
+    """Посты автора, а с comments=True и его комментарии, словарями.
+
+    iterator() читает базу порциями по CHUNK_SIZE строк, порядок по
+    первичному ключу не требует сортировки, поэтому память не зависит
+    от числа записей.
+    """
+    posts = (
+        Post.objects.using(using).filter(author_id=author_id).order_by('pk')
+        .values_list('id', 'pub_date', 'text', 'group__slug', 'image')
+    )
+    for pk, pub_date, text, group, image in posts.iterator(CHUNK_SIZE):
+        yield {'kind': 'post', 'id': pk, 'pub_date': pub_date, 'text': text,
+               'group': group, 'image': image or None, 'post': None}
+    if not comments:
+        return
+    comment_list = (
+        Comment.objects.using(using).filter(author_id=author_id)
+        .order_by('pk').values_list('id', 'pub_date', 'text', 'post_id')
+    )
+    for pk, pub_date, text, post in comment_list.iterator(CHUNK_SIZE):
+        yield {'kind': 'comment', 'id': pk, 'pub_date': pub_date,
+               'text': text, 'group': None, 'image': None, 'post': post}
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson(items):
+    for item in items:
+        yield json.dumps(item, cls=DjangoJSONEncoder,
+                         ensure_ascii=False) + '\n'
+
+
+def to_csv(items):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for item in items:
+        yield writer.writerow([
+            '' if item[column] is None else item[column]
+            for column in COLUMNS
+        ])
+
+
+def export(author_id, export_format, comments=False, using=None):
+    """Строки выгрузки в формате ndjson или csv."""
+    encode = ndjson if export_format == 'ndjson' else to_csv
+    return encode(rows(author_id, comments, using))
@@ -0,0 +1,24 @@
+from posts.includes.groups import with_groups
+
+# Версия кешей лент, меняется при любой записи в постах, группах,
+# комментариях и подписках
+FEED_VERSION = 'feed'
+
+# Поля, которые использует карточка поста posts/includes/post.html
+FEED_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'updated_at',
+    'image',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group',
+)
+
+
+def feed(post_list):
+    """Готовит queryset ленты: автор подтягивается JOIN, группа берется
+    из реестра групп в памяти процесса."""
+    return with_groups(post_list.select_related('author').only(*FEED_FIELDS))
@@ -1,8 +1,66 @@
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth import get_user_model
+from django.db import connections, router
 
+from core.cache import bump_version
+from posts.includes.feed import FEED_VERSION
 from posts.models import Follow
+from posts.signals import follow_created, follow_deleted
 
+User = get_user_model()
 
-@login_required
-def follow(request, author):
-    return Follow.objects.filter(author=author, user=request.user).exists()
+
+def _names():
+    quote = connections[router.db_for_write(Follow)].ops.quote_name
+    follow_meta, user_meta = Follow._meta, User._meta
+    return {
+        'follow': quote(follow_meta.db_table),
+        'follow_user': quote(follow_meta.get_field('user').column),
+        'follow_author': quote(follow_meta.get_field('author').column),
+        'user': quote(user_meta.db_table),
+        'id': quote(user_meta.pk.column),
+        'username': quote(user_meta.get_field('username').column),
+    }
+
+
+def _execute(sql, params):
+    with connections[router.db_for_write(Follow)].cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def subscribe(user_id, username):
+    """Подписывает на автора одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Поиск автора по имени входит в тот же запрос, поэтому гонки между
+    проверкой и вставкой нет. Возвращает id автора, если подписка
+    появилась, и None, если она уже была, автора нет или это сам
+    пользователь.
+    """
+    author_id = _execute(
+        'INSERT INTO {follow} ({follow_user}, {follow_author}) '
+        'SELECT %s, {id} FROM {user} WHERE {username} = %s AND {id} <> %s '
+        'ON CONFLICT ({follow_user}, {follow_author}) DO NOTHING '
+        'RETURNING {follow_author}'.format(**_names()),
+        [user_id, username, user_id],
+    )
+    if author_id is not None:
+        # Сырой SQL не отправляет сигналы модели
+        follow_created(user_id, author_id)
+        bump_version(FEED_VERSION)
+    return author_id
+
+
+def unsubscribe(user_id, username):
+    """Удаляет подписку одним DELETE; возвращает id автора, если
+    подписка была."""
+    author_id = _execute(
+        'DELETE FROM {follow} WHERE {follow_user} = %s AND {follow_author} = '
+        '(SELECT {id} FROM {user} WHERE {username} = %s) '
+        'RETURNING {follow_author}'.format(**_names()),
+        [user_id, username],
+    )
+    if author_id is not None:
+        follow_deleted(user_id, author_id)
+        bump_version(FEED_VERSION)
+    return author_id
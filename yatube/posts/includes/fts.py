@@ -0,0 +1,43 @@
+from django.db import connection
+
+# Внешний FTS5-индекс по posts_post.text, синхронизируется триггерами
+FTS_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts
+    USING fts5(text, content='posts_post', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_au
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+
+def install(using_connection=connection):
+    """Создает индекс и триггеры, если их нет.
+
+    SQLite-миграции Django пересоздают таблицу posts_post и теряют
+    триггеры, поэтому install вызывается и после каждого migrate.
+    """
+    if using_connection.vendor != 'sqlite':
+        return
+    with using_connection.cursor() as cursor:
+        for sql in FTS_SQL:
+            cursor.execute(sql)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.query import ModelIterable
+
+from core.cache import get_version
+from posts.models import Group, Post
+
+# Версия реестра групп, меняется при сохранении и удалении группы
+GROUPS_VERSION = 'groups'
+
+# Таблица групп маленькая и меняется редко, поэтому каждый процесс
+# держит ее целиком в памяти. Перед обращением сверяется версия из
+# кеша: с общим для процессов бэкендом (Memcached, Redis) правка группы
+# в любом процессе перечитывает реестр во всех. LocMemCache у каждого
+# процесса свой, и чужую правку он не увидит - поэтому реестр в любом
+# случае перечитывается не реже GROUPS_REGISTRY_TIMEOUT секунд.
+# Счетчик posts_count в реестр не входит - он меняется update() без
+# сигналов и читается из базы.
+_registry = (None, 0, {}, {})
+_lock = threading.Lock()
+
+
+def _stale(registry, version):
+    version_loaded, loaded_at = registry[:2]
+    return (version_loaded != version
+            or time.monotonic() - loaded_at
+            >= settings.GROUPS_REGISTRY_TIMEOUT)
+
+
+def _load():
+    """(by_slug, by_id) для текущей версии, при смене версии или
+    истечении GROUPS_REGISTRY_TIMEOUT - перечитанные одним запросом."""
+    global _registry
+    # Версия читается до выборки: если группу изменят во время
+    # загрузки, версия снова сменится и реестр перечитается
+    version = get_version(GROUPS_VERSION)
+    if _stale(_registry, version):
+        with _lock:
+            if _stale(_registry, version):
+                groups = list(Group.objects.defer('posts_count'))
+                _registry = (
+                    version,
+                    time.monotonic(),
+                    {group.slug: group for group in groups},
+                    {group.pk: group for group in groups},
+                )
+    return _registry[2], _registry[3]
+
+
+def by_slug(slug):
+    """Группа по slug или None. Экземпляр общий, только для чтения."""
+    return _load()[0].get(slug)
+
+
+def by_id(pk):
+    return _load()[1].get(pk)
+
+
+class GroupIterable(ModelIterable):
+    """Подставляет post.group из реестра вместо JOIN или запроса на
+    каждую карточку."""
+
+    def __iter__(self):
+        groups = _load()[1]
+        cache_group = Post.group.field.set_cached_value
+        for post in super().__iter__():
+            group = groups.get(post.group_id)
+            if group is not None:
+                cache_group(post, group)
+            yield post
+
+
+def with_groups(post_list):
+    queryset = post_list.all()
+    queryset._iterable_class = GroupIterable
+    return queryset
@@ -1,7 +1,293 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import time
+from collections.abc import Sequence
+from datetime import datetime
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-def paginator(post_list, count, request):
-    paginator = Paginator(post_list, count)
+# Направления курсора: к более старым и к более новым записям
+OLDER = 'o'
+NEWER = 'n'
+# Поля порядка ленты: дата публикации и ключ для записей с равной датой
+ORDER = ('pub_date', 'pk')
+
+
+def encode_cursor(direction, item):
+    """Упаковывает позицию (pub_date, id) записи в непрозрачную строку."""
+    if isinstance(item, dict):
+        pub_date, pk = item['pub_date'], item['id']
+    else:
+        pub_date, pk = item.pub_date, item.pk
+    raw = f'{direction}{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (direction, pub_date, id) или None для битого курсора."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, position = raw[0], raw[1:]
+        pub_date, pk = position.rsplit('|', 1)
+        if direction not in (OLDER, NEWER):
+            return None
+        return direction, datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, IndexError):
+        return None
+
+
+class CursorPage(Sequence):
+    """Страница ленты, полученная по курсору (pub_date, id)."""
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return '<CursorPage>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next() and self.object_list:
+            return encode_cursor(OLDER, self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous() and self.object_list:
+            return encode_cursor(NEWER, self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы равна стоимости первой: выборка идет
+    диапазоном по индексу (pub_date, id) от позиции из курсора.
+    """
+
+    def __init__(self, object_list, per_page, order=ORDER):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.order = order
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        queryset, direction = self.ordered(position)
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        has_other = position is not None
+        if direction == OLDER:
+            return CursorPage(items, has_next=has_more,
+                              has_previous=has_other)
+        items.reverse()
+        return CursorPage(items, has_next=has_other, has_previous=has_more)
+
+    def ordered(self, position):
+        """Записи после позиции (direction, pub_date, id) в порядке обхода:
+        к старым по убыванию, к новым по возрастанию.
+
+        order задает поля, по которым идет обход. Их значения должны
+        совпадать с pub_date и pk записи: из них строится курсор.
+        """
+        date, key = self.order
+        if position is None:
+            return self.object_list.order_by(f'-{date}', f'-{key}'), OLDER
+        direction, pub_date, pk = position
+        # Нестрогая граница по дате превращает условие в диапазон индекса
+        if direction == OLDER:
+            queryset = self.object_list.filter(
+                Q(**{f'{date}__lte': pub_date})
+                & (Q(**{f'{date}__lt': pub_date})
+                   | Q(**{date: pub_date, f'{key}__lt': pk}))
+            ).order_by(f'-{date}', f'-{key}')
+        else:
+            queryset = self.object_list.filter(
+                Q(**{f'{date}__gte': pub_date})
+                & (Q(**{f'{date}__gt': pub_date})
+                   | Q(**{date: pub_date, f'{key}__gt': pk}))
+            ).order_by(date, key)
+        return queryset, direction
+
+
+# Полный индекс таблицы для sqlite_stat1: (alias, таблица) -> имя
+_full_indexes = {}
+# Базы, где статистика недоступна (sqlite_stat1 нет, пока не было
+# ANALYZE): alias -> time.monotonic(), до которого не спрашивать снова.
+# Ошибочный запрос не повторяется на каждый промах кеша, а ANALYZE
+# замечается через STATISTICS_RETRY_TIMEOUT секунд
+_no_statistics = {}
+
+
+def _full_index(connection, model):
+    """Имя любого полного индекса таблицы или None, если индексов нет.
+
+    Строка sqlite_stat1 частичного индекса считает только попавшие в
+    него строки. Django создает частичные индексы только из
+    Meta.indexes с condition, остальные индексы таблицы полные.
+    Список индексов читается один раз на процесс.
+    """
+    table = model._meta.db_table
+    key = (connection.alias, table)
+    if key not in _full_indexes:
+        partial = {index.name for index in model._meta.indexes
+                   if index.condition is not None}
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table
+            )
+        names = sorted(name for name, info in constraints.items()
+                       if info['index'] and name not in partial)
+        _full_indexes[key] = names[0] if names else None
+    return _full_indexes[key]
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы по статистике СУБД без COUNT(*).
+
+    Работает только для нефильтрованных querysets, иначе возвращает None.
+    """
+    if queryset.query.where:
+        return None
+    if time.monotonic() < _no_statistics.get(queryset.db, 0):
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    params = [table]
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'sqlite':
+        # Заполняется командой ANALYZE, первое число stat - строки таблицы.
+        # У таблицы без индексов единственная строка с idx IS NULL
+        index = _full_index(connection, queryset.model)
+        if index is None:
+            sql = ('SELECT stat FROM sqlite_stat1 '
+                   'WHERE tbl = %s AND idx IS NULL')
+        else:
+            sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx = %s'
+            params.append(index)
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        _no_statistics[queryset.db] = (
+            time.monotonic() + settings.STATISTICS_RETRY_TIMEOUT
+        )
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class WindowPage(Page):
+    @property
+    def window(self):
+        return self.paginator.get_window(self.number)
+
+    @property
+    def next_cursor(self):
+        """Курсор для подгрузки ленты после этой страницы."""
+        if self.has_next() and len(self):
+            return encode_cursor(OLDER, self[-1])
+        return None
+
+
+class WindowPaginator(Paginator):
+    """Paginator, который показывает не все номера страниц, а окно
+    вокруг текущей и края списка."""
+
+    def _get_page(self, *args, **kwargs):
+        return WindowPage(*args, **kwargs)
+
+    def get_window(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц для навигации, None на месте пропуска."""
+        num_pages = self.num_pages
+        if num_pages <= (on_each_side + on_ends) * 2 + 1:
+            return list(self.page_range)
+        window = []
+        if number > on_each_side + on_ends + 2:
+            window.extend(range(1, on_ends + 1))
+            window.append(None)
+            window.extend(range(number - on_each_side, number + 1))
+        else:
+            window.extend(range(1, number + 1))
+        if number < num_pages - on_each_side - on_ends - 1:
+            window.extend(range(number + 1, number + on_each_side + 1))
+            window.append(None)
+            window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+        else:
+            window.extend(range(number + 1, num_pages + 1))
+        return window
+
+
+class EstimatedCountPaginator(WindowPaginator):
+    """Paginator без точного COUNT(*) на каждом запросе.
+
+    Число страниц хранится в кеше COUNT_CACHE_TIMEOUT секунд. При промахе
+    для больших нефильтрованных таблиц берется оценка из статистики СУБД,
+    в остальных случаях - точный COUNT(*). Ключ - только сам запрос:
+    версия кешей лент меняется на каждую запись, и с ней число
+    пересчитывалось бы почти всегда. После записи число может отставать
+    до COUNT_CACHE_TIMEOUT секунд.
+    """
+
+    def _count_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        return f'count:{digest}'
+
+    @cached_property
+    def count(self):
+        key = self._count_key()
+        count = cache.get(key)
+        if count is None:
+            count = estimate_count(self.object_list)
+            if count is None or count < settings.ESTIMATE_COUNT_FROM:
+                count = super().count
+            cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+        return count
+
+
+def paginator(post_list, count, request, cursor=None, order=ORDER):
+    if cursor is None:
+        cursor = settings.CURSOR_PAGINATION
+    if cursor:
+        return CursorPaginator(post_list, count, order).get_page(
+            request.GET.get('cursor')
+        )
+    # Порядок тот же, что у курсора: подгрузка при прокрутке продолжает
+    # ленту ровно с записи после последней на странице
+    date, key = order
+    paginator = EstimatedCountPaginator(
+        post_list.order_by(f'-{date}', f'-{key}'), count
+    )
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
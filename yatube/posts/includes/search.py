@@ -0,0 +1,31 @@
+from django.db import connections, router
+
+from posts.models import Post
+
+
+def _match_expression(query):
+    # Каждое слово берем в кавычки, чтобы пользовательский ввод
+    # не разбирался как синтаксис FTS5
+    terms = query.split()
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search(query, limit):
+    """id постов, подходящих под запрос, от самых релевантных."""
+    expression = _match_expression(query)
+    if not expression:
+        return []
+    # Как и ORM-запросы, поиск читает с базы, выбранной router
+    connection = connections[router.db_for_read(Post)]
+    if connection.vendor != 'sqlite':
+        return list(
+            Post.objects.filter(text__icontains=query)
+            .values_list('id', flat=True)[:limit]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s '
+            'ORDER BY rank LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,211 @@
+import itertools
+import random
+from bisect import bisect_left
+from datetime import timedelta
+from multiprocessing import Pool
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max
+from faker import Faker
+
+from core.cache import bump_version
+from core.models import CreatedModel
+from posts.includes.groups import GROUPS_VERSION
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Словарь для текстов строится один раз: Faker слишком медленный,
+# чтобы вызывать его на каждую из миллионов строк
+_vocabulary = None
+_weights = {}
+
+
+def _words():
+    global _vocabulary
+    if _vocabulary is None:
+        faker = Faker('ru_RU')
+        faker.seed_instance(0)
+        _vocabulary = faker.words(nb=2000)
+    return _vocabulary
+
+
+def _text(rnd, low, high):
+    return ' '.join(rnd.choices(_words(), k=rnd.randint(low, high)))
+
+
+def _power_law(size, alpha):
+    """Накопленные веса 1 / rank^alpha для выбора по степенному закону."""
+    key = (size, alpha)
+    if key not in _weights:
+        _weights[key] = list(itertools.accumulate(
+            1 / (rank ** alpha) for rank in range(1, size + 1)
+        ))
+    return _weights[key]
+
+
+def _pick(rnd, cum_weights):
+    return bisect_left(cum_weights, rnd.random() * cum_weights[-1])
+
+
+def _date(rnd, now, days):
+    return now - timedelta(seconds=rnd.randint(0, days * 24 * 60 * 60))
+
+
+def generate(spec):
+    """Строит одну пачку строк. Зависит только от spec, поэтому результат
+    одинаков при любом числе процессов."""
+    kind, index, start, size, options = spec
+    rnd = random.Random(f'{options["seed"]}:{kind}:{index}')
+    if kind == 'posts':
+        authors = _power_law(options['users'], options['alpha'])
+        rows = []
+        for _ in range(size):
+            group = None
+            if options['groups'] and rnd.random() < 0.5:
+                group = rnd.randrange(options['groups'])
+            rows.append((_pick(rnd, authors), group, _text(rnd, 5, 60),
+                         _date(rnd, options['now'], options['days'])))
+        return kind, start, rows
+    if kind == 'comments':
+        posts = _power_law(options['posts'], options['alpha'])
+        return kind, start, [
+            (_pick(rnd, posts), rnd.randrange(options['users']),
+             _text(rnd, 2, 20), _date(rnd, options['now'], options['days']))
+            for _ in range(size)
+        ]
+    # Подписки: степень вершины по Парето, популярные авторы чаще
+    authors = _power_law(options['users'], options['alpha'])
+    mean = options['alpha'] / (options['alpha'] - 1)
+    scale = options['follows'] / options['users'] / mean
+    rows = []
+    for user in range(start, start + size):
+        degree = min(round(rnd.paretovariate(options['alpha']) * scale),
+                     options['users'] - 1)
+        targets = set()
+        # Популярных авторов выбирают повторно, поэтому попыток с запасом
+        for _ in range(degree * 4):
+            if len(targets) >= degree:
+                break
+            author = _pick(rnd, authors)
+            if author != user:
+                targets.add(author)
+        rows.extend((user, author) for author in targets)
+    return kind, start, rows
+
+
+def _insert(model, names, rows):
+    """Вставка через executemany: без создания экземпляров моделей,
+    на которые bulk_create тратит большую часть времени."""
+    meta = model._meta
+    quote = connection.ops.quote_name
+    columns = [quote(meta.get_field(name).column) for name in names]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(meta.db_table), ', '.join(columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _insert_posts(first_id, rows):
+    _insert(
+        Post,
+        ('id', 'author', 'group', 'text', 'pub_date', 'updated_at', 'image',
+         'comments_count'),
+        [(first_id + i, author, group, text, date, date, '', 0)
+         for i, (author, group, text, date) in enumerate(rows)],
+    )
+
+
+def _insert_comments(first_id, rows):
+    # Comment унаследован от CreatedModel через отдельную таблицу
+    _insert(CreatedModel, ('id', 'pub_date'),
+            [(first_id + i, row[3]) for i, row in enumerate(rows)])
+    _insert(Comment, ('createdmodel_ptr', 'post', 'author', 'text'),
+            [(first_id + i, post, author, text)
+             for i, (post, author, text, date) in enumerate(rows)])
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _specs(kind, total, batch_size, options):
+    for index, start in enumerate(range(0, total, batch_size)):
+        yield kind, index, start, min(batch_size, total - start), options
+
+
+def seed(users, groups, posts, comments, follows, seed_value, now,
+         days=365, alpha=1.2, batch_size=5000, workers=0, prefix='seed',
+         log=None):
+    """Наполняет базу синтетическими данными пачками: пользователей и
+    группы через bulk_create, посты, комментарии и подписки через
+    executemany."""
+    log = log or (lambda message: None)
+    first_user = _next_id(User)
+    with transaction.atomic():
+        for start in range(0, users, batch_size):
+            User.objects.bulk_create(
+                User(id=first_user + i, username=f'{prefix}{first_user + i}',
+                     password='!')
+                for i in range(start, min(start + batch_size, users))
+            )
+    log(f'Пользователи: {users}')
+    first_group = _next_id(Group)
+    Group.objects.bulk_create(
+        (Group(id=first_group + i, title=f'Группа {first_group + i}',
+               slug=f'{prefix}-{first_group + i}',
+               description='Сгенерированная группа')
+         for i in range(groups)),
+        batch_size=batch_size,
+    )
+    # bulk_create не отправляет сигналов, реестр групп сбрасываем сами
+    bump_version(GROUPS_VERSION)
+    log(f'Группы: {groups}')
+    options = {
+        'seed': seed_value, 'now': now, 'days': days, 'alpha': alpha,
+        'users': users, 'groups': groups, 'posts': posts, 'follows': follows,
+    }
+    first_post = _next_id(Post)
+    first_comment = _next_id(CreatedModel)
+    specs = itertools.chain(
+        _specs('posts', posts, batch_size, options),
+        _specs('comments', comments if posts else 0, batch_size, options),
+        _specs('follows', users if follows and users > 1 else 0, batch_size,
+               options),
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    builders = {
+        'posts': lambda start, rows: _insert_posts(
+            first_post + start,
+            [(first_user + author,
+              None if group is None else first_group + group,
+              text, adapt(date))
+             for author, group, text, date in rows],
+        ),
+        'comments': lambda start, rows: _insert_comments(
+            first_comment + start,
+            [(first_post + post, first_user + author, text, adapt(date))
+             for post, author, text, date in rows],
+        ),
+        # Пары уникальны внутри пользователя, а пользователи новые
+        'follows': lambda start, rows: _insert(
+            Follow, ('user', 'author'),
+            [(first_user + user, first_user + author)
+             for user, author in rows],
+        ),
+    }
+    # imap сохраняет порядок пачек: посты записываются до комментариев
+    pool = Pool(workers) if workers > 1 else None
+    batches = pool.imap(generate, specs) if pool else map(generate, specs)
+    try:
+        for kind, start, rows in batches:
+            with transaction.atomic():
+                builders[kind](start, rows)
+            log(f'{kind}: +{len(rows)}')
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
@@ -0,0 +1,62 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = Lock()
+
+
+def _ready_key(name, size):
+    return f'thumbnail:{size}:{name}'
+
+
+def ready_url(name, size):
+    """URL готовой миниатюры или None, если ее еще не сгенерировали."""
+    return cache.get(_ready_key(name, size))
+
+
+def generate(name):
+    """Создает все миниатюры изображения из THUMBNAIL_GEOMETRIES."""
+    for size, (geometry, options) in settings.THUMBNAIL_GEOMETRIES.items():
+        thumbnail = get_thumbnail(name, geometry, **options)
+        cache.set(_ready_key(name, size), thumbnail.url, None)
+
+
+def _run(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        close_old_connections()
+
+
+def _submit(name):
+    global _executor
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    _executor.submit(_run, name)
+
+
+def schedule(image):
+    """Ставит генерацию миниатюр в фон после фиксации транзакции."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: _submit(name))
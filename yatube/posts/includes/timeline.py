@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F
+
+from posts.includes.paginator import ORDER
+from posts.models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def enabled():
+    return settings.FOLLOW_TIMELINE
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def _trim(users, params):
+    """Оставляет не больше TIMELINE_LENGTH записей в лентах
+    пользователей из подзапроса users одним DELETE."""
+    connection = connections[router.db_for_write(TimelineEntry)]
+    quote = connection.ops.quote_name
+    entry_meta, follow_meta = TimelineEntry._meta, Follow._meta
+    names = {
+        'entry': quote(entry_meta.db_table),
+        'id': quote(entry_meta.pk.column),
+        'user': quote(entry_meta.get_field('user').column),
+        'post': quote(entry_meta.get_field('post').column),
+        'pub_date': quote(entry_meta.get_field('pub_date').column),
+        'follow': quote(follow_meta.db_table),
+        'follow_user': quote(follow_meta.get_field('user').column),
+        'follow_author': quote(follow_meta.get_field('author').column),
+    }
+    sql = (
+        'DELETE FROM {entry} WHERE {id} IN ('
+        'SELECT {id} FROM (SELECT {id}, ROW_NUMBER() OVER ('
+        'PARTITION BY {user} ORDER BY {pub_date} DESC, {post} DESC'
+        ') AS position FROM {entry} WHERE {user} IN (%s)) ranked '
+        'WHERE position > %%s)' % users
+    ).format(**names)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [settings.TIMELINE_LENGTH])
+
+
+def trim(user_id):
+    """Оставляет в ленте пользователя не больше TIMELINE_LENGTH записей."""
+    _trim('%s', [user_id])
+
+
+def trim_followers(author_id):
+    """То же для лент всех подписчиков автора одним запросом."""
+    _trim('SELECT {follow_user} FROM {follow} WHERE {follow_author} = %s',
+          [author_id])
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    _insert([
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers
+    ])
+    if followers:
+        trim_followers(post.author_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    )
+    _insert([
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    ])
+    trim(user_id)
+
+
+def drop(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+# Лента по колонкам самих записей ленты: выборка страницы идет одним
+# диапазоном по индексу timeline_user_pub_date_idx, без сортировки
+TIMELINE_ORDER = ('timeline_date', 'timeline_post')
+
+
+def posts_for(user):
+    """Посты ленты подписок пользователя и поля ее порядка для
+    paginator и CursorPaginator."""
+    if enabled():
+        # annotate после filter использует тот же JOIN с записями ленты
+        post_list = Post.objects.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post'),
+        )
+        return post_list, TIMELINE_ORDER
+    return Post.objects.filter(author__following__user=user), ORDER
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.includes import benchmark
+from posts.includes.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержки и SQL-запросы публичных view на '\
+           'синтетических данных разного объема'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000',
+                            help='Число постов в наборах через запятую')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warm', action='store_true',
+                            help='Не сбрасывать кеш между запросами')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline',
+                            help='Файл прошлого прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимый рост p95, доля')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        results = {}
+        for size in sizes:
+            # Каждый набор живет в отдельной тестовой базе
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                benchmark.dataset(size)
+                recount()
+                results[str(size)] = benchmark.measure(
+                    options['repeat'], warm=options['warm']
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            for name, row in results[str(size)].items():
+                self.stdout.write(
+                    f'{size:>9} {name:<14} p50 {row["p50_ms"]:>9.2f} мс  '
+                    f'p95 {row["p95_ms"]:>9.2f} мс  '
+                    f'SQL {row["queries"]:>3} / {row["sql_ms"]:.2f} мс'
+                )
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = benchmark.compare(
+                    results, json.load(baseline), options['tolerance']
+                )
+            if regressions:
+                raise CommandError(
+                    'Регрессии производительности:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
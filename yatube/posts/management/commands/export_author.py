@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.includes.export import FORMATS, export
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты автора (и его комментарии) в NDJSON или CSV '\
+           'потоком, не загружая их в память целиком'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--comments', action='store_true',
+                            help='Добавить комментарии автора')
+        parser.add_argument('--output',
+                            help='Файл для выгрузки, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(username=options['username']).first()
+        if author is None:
+            raise CommandError(f'Автор {options["username"]} не найден')
+        lines = export(author.id, options['format'],
+                       comments=options['comments'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='',
+                  encoding='utf-8') as output:
+            output.writelines(lines)
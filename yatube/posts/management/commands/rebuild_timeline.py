@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.includes.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет материализованные ленты подписок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS('Ленты подписок заполнены'))
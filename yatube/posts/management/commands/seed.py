@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from posts.includes import timeline
+from posts.includes.counters import recount
+from posts.includes.seed import seed
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу синтетическими пользователями, постами, '\
+           'комментариями и подписками для нагрузочных проверок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000,
+                            help='Примерное число подписок')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросать даты')
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степенного распределения')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Процессы для генерации строк')
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс имен пользователей и слагов групп')
+
+    def handle(self, *args, **options):
+        if options['alpha'] <= 1:
+            raise CommandError('--alpha должен быть больше 1')
+        if options['users'] < 1 and (options['posts'] or options['comments']):
+            raise CommandError('Для постов и комментариев нужны '
+                               'пользователи: --users должен быть больше 0')
+        started = time.monotonic()
+        seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            seed_value=options['seed'],
+            now=timezone.now().replace(microsecond=0),
+            days=options['days'],
+            alpha=options['alpha'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            prefix=options['prefix'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        # bulk_create не отправляет сигналов: счетчики и ленты
+        # пересчитываются целиком
+        with transaction.atomic():
+            recount()
+            if timeline.enabled():
+                timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.1f} с'
+        ))
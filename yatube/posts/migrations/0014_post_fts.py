@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Внешний FTS5-индекс по posts_post.text, синхронизируется триггерами.
+# SQL скопирован сюда, а не импортирован из posts.includes.fts: код
+# приложения может меняться, а миграция - нет
+FTS_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts
+    USING fts5(text, content='posts_post', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ai
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_ad
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_au
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+    schema_editor.execute(
+        "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS posts_post_fts_{trigger}'
+            )
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
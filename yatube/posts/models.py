@@ -21,6 +21,11 @@ class Group(models.Model):
         'Описание группы',
         help_text='Введите описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
@@ -36,6 +41,10 @@ class Post(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -58,9 +67,18 @@ class Post(models.Model):
         blank=True,
         help_text='Добавьте изображение по желанию'
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.text[:settings.POSTS_SLICE]
@@ -104,3 +122,50 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор',
     )
+
+
+class UserCounter(models.Model):
+    """Счетчики пользователя, чтобы не считать COUNT(*) на каждой странице."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок',
+        default=0,
+    )
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у его подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        unique_together = (('user', 'post'),)
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
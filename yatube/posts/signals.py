@@ -0,0 +1,183 @@
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save)
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from posts.includes import counters, fts, timeline
+from posts.includes.feed import FEED_VERSION
+from posts.includes.groups import GROUPS_VERSION
+from posts.models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+# Поля пользователя, которые выводятся на карточках постов
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def create_user_counter(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_feeds(sender, **kwargs):
+    bump_version(FEED_VERSION)
+
+
+@receiver(post_init, sender=User)
+def remember_names(sender, instance, **kwargs):
+    instance._loaded_names = {
+        field: instance.__dict__.get(field)
+        for field in USER_CARD_FIELDS
+        if field in instance.__dict__
+    }
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, created, raw, **kwargs):
+    # Закешированные страницы показывают имя автора на карточках.
+    # Вход пользователя сохраняет только last_login и кеши не трогает
+    if created or raw:
+        return
+    loaded = instance._loaded_names
+    if any(getattr(instance, field) != value
+           for field, value in loaded.items()):
+        bump_version(FEED_VERSION)
+    loaded.update((field, getattr(instance, field)) for field in loaded)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_groups(sender, **kwargs):
+    bump_version(GROUPS_VERSION)
+    # Процесс, перечитавший реестр до commit, мог получить старые данные
+    # под новой версией
+    transaction.on_commit(lambda: bump_version(GROUPS_VERSION))
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=Comment)
+@receiver(post_init, sender=Follow)
+def remember_relations(sender, instance, **kwargs):
+    # Запоминаем загруженные ключи, чтобы заметить их смену при сохранении.
+    # Берем из __dict__, чтобы не подгружать отложенные поля.
+    instance._loaded = {
+        field: instance.__dict__.get(field)
+        for field in ('author_id', 'group_id', 'user_id', 'post_id')
+        if field in instance.__dict__
+    }
+
+
+def _changed(instance, field):
+    """Старое значение ключа, который не бывает NULL, если его сменили
+    после загрузки, иначе None. Ключ, не загруженный из базы, считается
+    неизменным."""
+    loaded = instance._loaded
+    if field in loaded and loaded[field] != getattr(instance, field):
+        return loaded[field]
+    return None
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_user(instance.author_id, posts_count=1)
+        counters.change_group(instance.group_id, 1)
+        if timeline.enabled():
+            timeline.fan_out(instance)
+    else:
+        # Пост отредактировали в админке
+        old_author_id = _changed(instance, 'author_id')
+        if old_author_id is not None:
+            counters.change_user(old_author_id, posts_count=-1)
+            counters.change_user(instance.author_id, posts_count=1)
+        if 'group_id' in instance._loaded:
+            old_group_id = instance._loaded['group_id']
+            if old_group_id != instance.group_id:
+                counters.change_group(old_group_id, -1)
+                counters.change_group(instance.group_id, 1)
+    instance._loaded.update(author_id=instance.author_id,
+                            group_id=instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    counters.change_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_post(instance.post_id, 1)
+    else:
+        # Комментарий перенесли к другому посту в админке
+        old_post_id = _changed(instance, 'post_id')
+        if old_post_id is not None:
+            counters.change_post(old_post_id, -1)
+            counters.change_post(instance.post_id, 1)
+    instance._loaded['post_id'] = instance.post_id
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+def follow_created(user_id, author_id):
+    counters.change_user(user_id, following_count=1)
+    counters.change_user(author_id, followers_count=1)
+    if timeline.enabled():
+        timeline.backfill(user_id, author_id)
+
+
+def follow_deleted(user_id, author_id):
+    counters.change_user(user_id, following_count=-1)
+    counters.change_user(author_id, followers_count=-1)
+    if timeline.enabled():
+        timeline.drop(user_id, author_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    loaded = instance._loaded
+    if created:
+        follow_created(instance.user_id, instance.author_id)
+    elif ('user_id' in loaded and 'author_id' in loaded
+          and (loaded['user_id'], loaded['author_id'])
+          != (instance.user_id, instance.author_id)):
+        # Подписку отредактировали в админке
+        follow_deleted(loaded['user_id'], loaded['author_id'])
+        follow_created(instance.user_id, instance.author_id)
+    instance._loaded.update(user_id=instance.user_id,
+                            author_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    follow_deleted(instance.user_id, instance.author_id)
+
+
+@receiver(post_migrate)
+def install_fts(sender, using, **kwargs):
+    # Триггеры пропадают, когда миграция пересоздает таблицу posts_post
+    connection = connections[using]
+    if (sender.name == 'posts'
+            and 'posts_post_fts' in connection.introspection.table_names()):
+        fts.install(connection)
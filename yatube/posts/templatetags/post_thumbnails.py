@@ -0,0 +1,21 @@
+from django import template
+
+from posts.includes import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image, size):
+    """URL готовой миниатюры; если ее нет, ставит генерацию в очередь.
+    Страница с заглушкой не кешируется (core.cache.cache_shell), чтобы
+    готовая миниатюра появилась без сброса всех кешей ленты."""
+    if not image:
+        return None
+    url = thumbnails.ready_url(image.name, size)
+    if url is None:
+        thumbnails.schedule(image)
+        request = context.get('request')
+        if request is not None:
+            request.shell_cacheable = False
+    return url
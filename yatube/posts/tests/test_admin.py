@@ -0,0 +1,151 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import bump_version
+from posts.includes import paginator as paginator_module
+from posts.includes.feed import FEED_VERSION
+from posts.includes.paginator import (EstimatedCountPaginator,
+                                      estimate_count)
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin')
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        # Индексы таблиц для оценки числа строк читаются один раз на
+        # процесс; первый список в тесте не должен платить за это
+        for model in (Post, Comment, Follow):
+            estimate_count(model.objects.all())
+
+    def create_rows(self, start, stop):
+        for i in range(start, stop):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(title=f'Группа {i}', slug=f'slug{i}',
+                                         description='Описание')
+            post = Post.objects.create(author=author, group=group,
+                                       text=f'Текст №{i}')
+            Comment.objects.create(author=author, post=post, text='Коммент')
+            Follow.objects.create(user=author,
+                                  author=AdminChangelistTest.admin)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = AdminChangelistTest.admin_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context)
+
+    def test_changelist_without_distinct_dates(self):
+        """Список не перебирает даты всей таблицы через DISTINCT"""
+        self.create_rows(0, 2)
+        for model in ('post', 'comment'):
+            with self.subTest(model=model):
+                with CaptureQueriesContext(connection) as queries:
+                    AdminChangelistTest.admin_client.get(
+                        reverse(f'admin:posts_{model}_changelist')
+                    )
+                self.assertFalse([query for query in queries
+                                  if 'DISTINCT' in query['sql']])
+
+    def test_changelist_queries_do_not_depend_on_rows(self):
+        """Число запросов списка в админке не растет вместе со строками"""
+        urls = [
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_follow_changelist'),
+        ]
+        self.create_rows(0, 2)
+        before = {url: self.count_queries(url) for url in urls}
+        self.create_rows(2, 6)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+    def test_post_changelist_opens(self):
+        """Список постов открывается с фильтром по дате и FTS-поиском"""
+        self.create_rows(0, 2)
+        response = AdminChangelistTest.admin_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'Текст'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Текст №{i}') for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(ESTIMATE_COUNT_FROM=1)
+    def test_unfiltered_count_uses_statistics(self):
+        """Без фильтров число строк берется из статистики СУБД"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        # Отсутствие статистики до ANALYZE запомнено на
+        # STATISTICS_RETRY_TIMEOUT
+        paginator_module._no_statistics.clear()
+        Post.objects.filter(text='Текст №0').delete()
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        # Строка полного индекса, а не первая попавшаяся
+        self.assertIn('AND idx =', queries[-1]['sql'])
+
+    def test_missing_statistics_queried_once(self):
+        """Без sqlite_stat1 ошибочный запрос статистики не повторяется"""
+        paginator_module._no_statistics.clear()
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS sqlite_stat1')
+        with self.assertNumQueries(1):
+            self.assertIsNone(estimate_count(Post.objects.all()))
+        with self.assertNumQueries(0):
+            self.assertIsNone(estimate_count(Post.objects.all()))
+
+    @override_settings(STATISTICS_RETRY_TIMEOUT=0)
+    def test_statistics_found_after_analyze(self):
+        """Отсутствие статистики запоминается ненадолго: после ANALYZE
+        оценка снова берется из sqlite_stat1"""
+        paginator_module._no_statistics.clear()
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS sqlite_stat1')
+        self.assertIsNone(estimate_count(Post.objects.all()))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimate_count(Post.objects.all()), 3)
+
+    def test_count_cached_across_feed_writes(self):
+        """Число не пересчитывается на каждую запись в ленту"""
+        queryset = Post.objects.filter(text__startswith='Текст')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 3)
+        bump_version(FEED_VERSION)
+        with self.assertNumQueries(0):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 3)
+
+    def test_exact_count_is_cached(self):
+        """Точный подсчет кешируется"""
+        queryset = Post.objects.filter(text__startswith='Текст')
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 3)
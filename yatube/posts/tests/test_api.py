@@ -0,0 +1,94 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+def read(response):
+    return json.loads(b''.join(response.streaming_content))
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост №{i}')
+            for i in range(15)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ApiTest.reader)
+
+    def test_feeds_are_paginated_by_cursor(self):
+        """Все ленты отдаются порциями по курсору до конца"""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'group'}),
+            reverse('posts:api_profile', kwargs={'username': 'author'}),
+            reverse('posts:api_follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = read(self.authorized_client.get(url, {'limit': 10}))
+                second = read(self.authorized_client.get(
+                    url, {'limit': 10, 'cursor': first['next']}
+                ))
+                self.assertEqual(len(first['results']), 10)
+                self.assertEqual(len(second['results']), 5)
+                self.assertIsNone(second['next'])
+                ids = [post['id'] for post in
+                       first['results'] + second['results']]
+                self.assertEqual(ids, sorted(set(ids), reverse=True))
+
+    def test_fields_selection(self):
+        """?fields= оставляет в ответе только запрошенные поля"""
+        response = self.guest_client.get(reverse('posts:api_index'),
+                                         {'fields': 'text,author'})
+        post = read(response)['results'][0]
+        self.assertEqual(post, {'text': 'Пост №14', 'author': 'author'})
+        post_id = Post.objects.latest('pub_date').id
+        response = self.guest_client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': post_id}),
+            {'fields': 'id,group,image'},
+        )
+        self.assertEqual(response.json(),
+                         {'id': post_id, 'group': 'group', 'image': None})
+
+    def test_errors(self):
+        """Ошибки отдаются JSON с подходящим статусом"""
+        cases = (
+            (self.guest_client, reverse('posts:api_index'),
+             {'fields': 'password'}, HTTPStatus.BAD_REQUEST),
+            (self.guest_client, reverse('posts:api_index'),
+             {'limit': 0}, HTTPStatus.BAD_REQUEST),
+            (self.guest_client, reverse('posts:api_index'),
+             {'cursor': 'broken'}, HTTPStatus.BAD_REQUEST),
+            (self.guest_client, reverse('posts:api_follow_index'),
+             {}, HTTPStatus.UNAUTHORIZED),
+            (self.guest_client,
+             reverse('posts:api_group_list', kwargs={'slug': 'missing'}),
+             {}, HTTPStatus.NOT_FOUND),
+            (self.guest_client,
+             reverse('posts:api_post_detail', kwargs={'post_id': 0}),
+             {}, HTTPStatus.NOT_FOUND),
+        )
+        for client, url, data, status in cases:
+            with self.subTest(url=url, data=data):
+                response = client.get(url, data)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
@@ -0,0 +1,101 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.models import F, Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.includes import benchmark
+from posts.includes.counters import recount
+from posts.includes.seed import generate
+from posts.models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+class SeedCommandTest(TestCase):
+    def test_seed_creates_requested_rows(self):
+        """Команда seed создает данные и пересчитывает счетчики"""
+        call_command('seed', users=20, groups=3, posts=50, comments=30,
+                     follows=40, batch_size=16, stdout=StringIO())
+        counts = (
+            ('groups', Group.objects.count(), 3),
+            ('posts', Post.objects.count(), 50),
+            ('comments', Comment.objects.count(), 30),
+            ('posts_count',
+             UserCounter.objects.aggregate(total=Sum('posts_count'))['total'],
+             50),
+        )
+        for name, value, expected in counts:
+            with self.subTest(name=name):
+                self.assertEqual(value, expected)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+
+    def test_seed_without_users(self):
+        """Посты без пользователей не генерируются, команда сообщает
+        об ошибке"""
+        with self.assertRaises(CommandError):
+            call_command('seed', users=0, posts=10, comments=0, follows=0,
+                         stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    def test_generate_is_deterministic(self):
+        """Пачка зависит только от параметров и seed"""
+        options = {
+            'seed': 7, 'now': timezone.now(), 'days': 30, 'alpha': 1.5,
+            'users': 10, 'groups': 2, 'posts': 5, 'follows': 20,
+        }
+        for kind in ('posts', 'comments', 'follows'):
+            with self.subTest(kind=kind):
+                spec = (kind, 3, 0, 5, options)
+                self.assertEqual(generate(spec), generate(spec))
+
+
+class BenchmarkTest(TestCase):
+    def test_measure_collects_every_view(self):
+        """measure возвращает задержки и число запросов по каждой view"""
+        benchmark.dataset(100)
+        recount()
+        results = benchmark.measure(repeat=2)
+        self.assertIn('index', results)
+        self.assertIn('add_comment', results)
+        for name, row in results.items():
+            with self.subTest(name=name):
+                self.assertGreater(row['queries'], 0)
+                self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+
+    def test_compare_reports_regressions(self):
+        """Рост запросов и p95 сверх допуска считается регрессией"""
+        baseline = {'1000': {'index': {'p95_ms': 10, 'queries': 3}}}
+        cases = (
+            ({'p95_ms': 11, 'queries': 3}, 0),
+            ({'p95_ms': 13, 'queries': 3}, 1),
+            ({'p95_ms': 10, 'queries': 4}, 1),
+        )
+        for row, expected in cases:
+            with self.subTest(row=row):
+                regressions = benchmark.compare(
+                    {'1000': {'index': row}}, baseline, tolerance=0.2
+                )
+                self.assertEqual(len(regressions), expected)
+
+
+class ExportCommandTest(TestCase):
+    def test_export_author_to_stdout(self):
+        """export_author пишет по строке NDJSON на каждый пост"""
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост №{i}') for i in range(3)
+        )
+        stdout = StringIO()
+        call_command('export_author', 'author', stdout=stdout)
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([row['text'] for row in rows],
+                         ['Пост №0', 'Пост №1', 'Пост №2'])
+
+    def test_unknown_author(self):
+        with self.assertRaises(CommandError):
+            call_command('export_author', 'missing', stdout=StringIO())
@@ -1,8 +1,11 @@
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post, UserCounter
 
 User = get_user_model()
 
@@ -84,3 +87,98 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     group._meta.get_field(value).help_text, expected)
+
+
+class CounterModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='Тестовый слаг',
+            description='Тестовое описание',
+        )
+
+    def counter(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счетчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=CounterModelTest.user,
+                                   text='Тестовый пост',
+                                   group=CounterModelTest.group)
+        Comment.objects.create(author=CounterModelTest.follower, post=post,
+                               text='Тестовый коммент')
+        follow = Follow.objects.create(user=CounterModelTest.follower,
+                                       author=CounterModelTest.user)
+        post.refresh_from_db()
+        CounterModelTest.group.refresh_from_db()
+        author = self.counter(CounterModelTest.user)
+        counters = [
+            ('posts_count', author.posts_count, 1),
+            ('followers_count', author.followers_count, 1),
+            ('following_count',
+             self.counter(CounterModelTest.follower).following_count, 1),
+            ('group.posts_count', CounterModelTest.group.posts_count, 1),
+            ('comments_count', post.comments_count, 1),
+        ]
+        for name, value, expected in counters:
+            with self.subTest(counter=name):
+                self.assertEqual(value, expected)
+        follow.delete()
+        post.delete()
+        CounterModelTest.group.refresh_from_db()
+        self.assertEqual(self.counter(CounterModelTest.user).posts_count, 0)
+        self.assertEqual(
+            self.counter(CounterModelTest.follower).following_count, 0)
+        self.assertEqual(CounterModelTest.group.posts_count, 0)
+
+    def test_group_change_moves_counter(self):
+        """Смена группы поста переносит счетчик в новую группу."""
+        post = Post.objects.create(author=CounterModelTest.user,
+                                   text='Тестовый пост',
+                                   group=CounterModelTest.group)
+        post.group = None
+        post.save()
+        CounterModelTest.group.refresh_from_db()
+        self.assertEqual(CounterModelTest.group.posts_count, 0)
+
+    def test_author_change_moves_counter(self):
+        """Смена автора поста переносит счетчик к новому автору."""
+        post = Post.objects.create(author=CounterModelTest.user,
+                                   text='Тестовый пост')
+        post = Post.objects.get(pk=post.pk)
+        post.author = CounterModelTest.follower
+        post.save()
+        self.assertEqual(self.counter(CounterModelTest.user).posts_count, 0)
+        self.assertEqual(
+            self.counter(CounterModelTest.follower).posts_count, 1)
+
+    def test_comment_post_change_moves_counter(self):
+        """Перенос комментария к другому посту переносит счетчик."""
+        first, second = (
+            Post.objects.create(author=CounterModelTest.user, text=text)
+            for text in ('Первый пост', 'Второй пост')
+        )
+        comment = Comment.objects.create(author=CounterModelTest.follower,
+                                         post=first, text='Коммент')
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.post = second
+        comment.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.comments_count, 0)
+        self.assertEqual(second.comments_count, 1)
+
+    def test_recount_command(self):
+        """Команда recount восстанавливает счетчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=CounterModelTest.user, text=f'Пост {i}',
+                 group=CounterModelTest.group) for i in range(3)
+        )
+        call_command('recount', stdout=StringIO())
+        CounterModelTest.group.refresh_from_db()
+        self.assertEqual(self.counter(CounterModelTest.user).posts_count, 3)
+        self.assertEqual(CounterModelTest.group.posts_count, 3)
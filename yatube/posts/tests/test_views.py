@@ -1,21 +1,50 @@
+import csv
+import hashlib
+import json
+import re
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import quote_etag
 
-from posts.models import Follow, Group, Post
+from core.cache import bump_version, get_version
+from posts.includes import groups, thumbnails
+from posts.includes.conditional import post_etag
+from posts.includes.feed import FEED_VERSION
+from posts.includes.paginator import WindowPaginator, estimate_count
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          UserCounter)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
 
+class WarmGroupsMixin:
+    """Реестр групп перечитывается одним запросом при первом обращении
+    после cache.clear(): его версия хранится в кеше. Тесты, считающие
+    запросы страниц, прогревают реестр заранее, иначе число запросов
+    зависело бы от порядка тестов. Сама загрузка проверяется в
+    GroupRegistryTest.test_registry_loaded_by_one_query."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        groups.by_slug('')
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -61,6 +90,140 @@ class PaginatorViewsTest(TestCase):
                 response = PaginatorViewsTest.client.get(reverse_name)
                 self.assertEqual(len(response.context['page_obj']), count)
 
+    def test_page_window(self):
+        """Навигация показывает окно вокруг текущей страницы и края"""
+        paginator = WindowPaginator(range(200), 10)
+        cases = {
+            1: [1, 2, 3, None, 20],
+            5: [1, 2, 3, 4, 5, 6, 7, None, 20],
+            10: [1, None, 8, 9, 10, 11, 12, None, 20],
+            20: [1, None, 18, 19, 20],
+        }
+        for number, window in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(paginator.get_window(number), window)
+        self.assertEqual(WindowPaginator(range(50), 10).get_window(3),
+                         [1, 2, 3, 4, 5])
+
+    @override_settings(PAGE_OBJ_COUNT=1)
+    def test_numbered_pages_are_elided(self):
+        """Ссылки только на соседние страницы, первую и последнюю"""
+        response = PaginatorViewsTest.client.get(
+            reverse('posts:index') + '?page=8'
+        )
+        self.assertContains(response, '&hellip;', count=2)
+        for number in (1, 6, 7, 9, 10, 15):
+            self.assertContains(response, f'page={number}"')
+        for number in (2, 5, 11, 14):
+            self.assertNotContains(response, f'page={number}"')
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = Client()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Текст №{i}') for i in range(15)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_contains_expected_records(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу"""
+        url = reverse('posts:profile',
+                      kwargs={'username': CursorPaginatorViewsTest.author})
+        first_page = CursorPaginatorViewsTest.client.get(url).context[
+            'page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        second_page = CursorPaginatorViewsTest.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        back_page = CursorPaginatorViewsTest.client.get(
+            url, {'cursor': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор открывает первую страницу"""
+        response = CursorPaginatorViewsTest.client.get(
+            reverse('posts:index'), {'cursor': 'битый'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class FeedFragmentViewsTest(WarmGroupsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        cls.client = Client()
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(author=cls.author, user=cls.user)
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Текст №{i}', group=cls.group)
+            for i in range(15)
+        )
+
+    def next_url(self, response):
+        match = re.search(r'class="js-feed-more" data-url="([^"]+)"',
+                          response.content.decode())
+        return match and match.group(1)
+
+    def test_feed_pages_continue_with_fragments(self):
+        """Лента продолжается фрагментом с оставшимися постами"""
+        author = FeedFragmentViewsTest.author
+        pages = {
+            reverse('posts:index'): FeedFragmentViewsTest.client,
+            reverse('posts:group_list',
+                    args=[FeedFragmentViewsTest.group.slug]):
+                FeedFragmentViewsTest.client,
+            reverse('posts:profile', args=[author.username]):
+                FeedFragmentViewsTest.client,
+            reverse('posts:follow_index'):
+                FeedFragmentViewsTest.authorized_user,
+        }
+        for url, client in pages.items():
+            with self.subTest(url=url):
+                page = client.get(url)
+                fragment = client.get(self.next_url(page))
+                self.assertNotContains(fragment, '<html')
+                self.assertEqual(len(fragment.context['page_obj']), 5)
+                shown = {post.pk for post in page.context['page_obj']}
+                shown.update(
+                    post.pk for post in fragment.context['page_obj']
+                )
+                self.assertEqual(len(shown), 15)
+                self.assertIsNone(self.next_url(fragment))
+
+    def test_fragment_renders_only_cards(self):
+        """Фрагмент - одна выборка постов без шапки и подвала"""
+        with self.assertNumQueries(1):
+            response = FeedFragmentViewsTest.client.get(
+                reverse('posts:index_fragment')
+            )
+        self.assertContains(response, '<article>', count=10)
+        self.assertNotContains(response, '<header')
+        self.assertIsNotNone(self.next_url(response))
+
+    def test_follow_fragment_requires_login(self):
+        """Фрагмент ленты подписок доступен только авторизованным"""
+        response = FeedFragmentViewsTest.client.get(
+            reverse('posts:follow_fragment')
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewsTest(TestCase):
@@ -168,6 +331,40 @@ class PostViewsTest(TestCase):
             with self.subTest(object=object):
                 self.assertEqual(object, expected)
 
+    def test_thumbnail_placeholder_until_generated(self):
+        """Пока миниатюра не создана в фоне, выводится заглушка.
+        Страница с заглушкой не кешируется, версия ленты не меняется"""
+        version = get_version(FEED_VERSION)
+        url = reverse('posts:post_detail', kwargs={'post_id': 1})
+        response = PostViewsTest.client.get(url)
+        self.assertContains(response, 'img/placeholder.svg')
+        thumbnails.generate(response.context['post'].image.name)
+        response = PostViewsTest.client.get(url)
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+        self.assertEqual(get_version(FEED_VERSION), version)
+
+    def test_thumbnail_placeholder_not_revalidated(self):
+        """Страницу с заглушкой клиент не запоминает, а ETag поста
+        меняется с готовностью миниатюры: после ее создания приходит
+        новая страница, а не 304"""
+        url = reverse('posts:post_detail', kwargs={'post_id': 1})
+        response = PostViewsTest.client.get(url)
+        self.assertContains(response, 'img/placeholder.svg')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-store', response['Cache-Control'])
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        etag = quote_etag(post_etag(request, 1))
+        thumbnails.generate(response.context['post'].image.name)
+        response = PostViewsTest.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertNotEqual(response['ETag'], etag)
+        response = PostViewsTest.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
     def test_forms_pages_show_correct_context(self):
         """Шаблон post_create и post_edit
         сформирован с правильным контекстом."""
@@ -218,6 +415,102 @@ class PostViewsTest(TestCase):
                 self.assertEqual(bool, expected)
 
 
+class FeedQueriesViewsTest(WarmGroupsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = Client()
+        posts = []
+        for i in range(15):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'slug{i}',
+                description='Тестовое описание',
+            )
+            posts.append(Post(author=author, text=f'Текст №{i}', group=group))
+        Post.objects.bulk_create(posts)
+
+    def test_index_queries_do_not_depend_on_posts(self):
+        """Авторы и группы карточек не запрашиваются по одному"""
+        # Без ANALYZE статистики СУБД нет, первый же запрос запоминает
+        # это на STATISTICS_RETRY_TIMEOUT. Остаются ETag, COUNT(*) и
+        # сама страница
+        estimate_count(Post.objects.all())
+        with self.assertNumQueries(3):
+            FeedQueriesViewsTest.client.get(reverse('posts:index'))
+
+
+class GroupRegistryTest(WarmGroupsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = Client()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=cls.author, text='Текст',
+                            group=cls.group)
+
+    def test_group_pages_do_not_query_groups(self):
+        """Страница группы и метки групп на карточках берутся из реестра"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[GroupRegistryTest.group.slug]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = GroupRegistryTest.client.get(url)
+                self.assertContains(response, 'Тестовая группа')
+                self.assertFalse([query for query in queries
+                                  if 'posts_group' in query['sql']])
+
+    def test_registry_loaded_by_one_query(self):
+        """После смены версии реестр читается одним запросом, дальше
+        берется из памяти"""
+        bump_version(groups.GROUPS_VERSION)
+        with self.assertNumQueries(1):
+            groups.by_slug(GroupRegistryTest.group.slug)
+        with self.assertNumQueries(0):
+            groups.by_id(GroupRegistryTest.group.pk)
+
+    def test_registry_reloaded_after_timeout(self):
+        """Без смены версии (свой кеш у каждого процесса) реестр
+        перечитывается по истечении GROUPS_REGISTRY_TIMEOUT"""
+        group = GroupRegistryTest.group
+        Group.objects.filter(pk=group.pk).update(title='Новое название')
+        self.assertEqual(groups.by_id(group.pk).title, 'Тестовая группа')
+        with self.settings(GROUPS_REGISTRY_TIMEOUT=0):
+            self.assertEqual(groups.by_id(group.pk).title, 'Новое название')
+
+    def test_registry_follows_version(self):
+        """Реестр перечитывается после смены версии в общем кеше"""
+        group = GroupRegistryTest.group
+        self.assertEqual(groups.by_id(group.pk).title, 'Тестовая группа')
+        # update() без сигналов: так выглядит правка из другого процесса
+        # до того, как он сменил версию
+        Group.objects.filter(pk=group.pk).update(title='Новое название')
+        self.assertEqual(groups.by_id(group.pk).title, 'Тестовая группа')
+        bump_version(groups.GROUPS_VERSION)
+        self.assertEqual(groups.by_id(group.pk).title, 'Новое название')
+
+    def test_group_changes_invalidate_registry(self):
+        """Сохранение и удаление группы сразу видны в реестре"""
+        group = Group.objects.create(title='Временная', slug='temporary',
+                                     description='Описание')
+        self.assertEqual(groups.by_slug('temporary'), group)
+        group.delete()
+        self.assertIsNone(groups.by_slug('temporary'))
+        response = GroupRegistryTest.client.get(
+            reverse('posts:group_list', args=['temporary'])
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
 class CacheViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -233,15 +526,296 @@ class CacheViewsTest(TestCase):
         """Страница index кешируется так как надо"""
         cache.clear()
         old_response = CacheViewsTest.client.get(reverse('posts:index'))
-        Post.objects.all().delete()
+        # update() не отправляет сигналов, поэтому кеш не сбрасывается
+        Post.objects.all().update(text='Измененный текст')
         cached_response = CacheViewsTest.client.get(reverse('posts:index'))
         self.assertEqual(old_response.content, cached_response.content)
         cache.clear()
         new_response = CacheViewsTest.client.get(reverse('posts:index'))
         self.assertNotEqual(old_response.content, new_response.content)
 
+    def test_stale_page_served_without_etag(self):
+        """Устаревшую страницу, пока ее пересчитывает другой процесс,
+        клиент не запоминает: ETag уже от новой версии"""
+        cache.clear()
+        url = reverse('posts:index')
+        self.assertTrue(CacheViewsTest.client.get(url).has_header('ETag'))
+        bump_version(FEED_VERSION)
+        path = hashlib.md5(url.encode()).hexdigest()
+        cache.add(f'shell:index_page:{path}:lock', 1)
+        response = CacheViewsTest.client.get(url)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-store', response['Cache-Control'])
+        cache.delete(f'shell:index_page:{path}:lock')
+        response = CacheViewsTest.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_cached_pages_invalidated_by_writes(self):
+        """Новый пост сразу виден на закешированных страницах"""
+        cache.clear()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile',
+                    kwargs={'username': CacheViewsTest.author}),
+        ]
+        for url in urls:
+            CacheViewsTest.client.get(url)
+        Post.objects.create(author=CacheViewsTest.author, text='Новый пост')
+        for url in urls:
+            with self.subTest(url=url):
+                response = CacheViewsTest.client.get(url)
+                self.assertContains(response, 'Новый пост')
+
+    def test_cached_pages_invalidated_by_author_rename(self):
+        """Новое имя автора сразу видно на закешированных страницах"""
+        cache.clear()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile',
+                    kwargs={'username': CacheViewsTest.author}),
+        ]
+        for url in urls:
+            CacheViewsTest.client.get(url)
+        author = User.objects.get(pk=CacheViewsTest.author.pk)
+        author.first_name = 'Лев'
+        author.last_name = 'Толстой'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = CacheViewsTest.client.get(url)
+                self.assertContains(response, 'Автор: Лев Толстой')
+
+    def test_login_does_not_invalidate_cached_pages(self):
+        """Сохранение пользователя без смены имени не сбрасывает кеши"""
+        version = get_version(FEED_VERSION)
+        author = User.objects.get(pk=CacheViewsTest.author.pk)
+        author.save(update_fields=['last_login'])
+        self.assertEqual(get_version(FEED_VERSION), version)
+
+    def test_anonymous_cached_pages_not_served_to_users(self):
+        """Закешированная для анонима страница не достается вошедшему
+        пользователю с чужой шапкой"""
+        cache.clear()
+        authorized_client = Client()
+        authorized_client.force_login(CacheViewsTest.author)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile',
+                    kwargs={'username': CacheViewsTest.author}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(Client().get(url), 'Войти')
+                response = authorized_client.get(url)
+                self.assertContains(response, 'Пользователь: author')
+                self.assertNotContains(response, 'Войти')
+
+
+class ConditionalGetViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Текст'
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_unchanged_pages_return_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304 без рендеринга"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_with_content_and_user(self):
+        """ETag меняется после правки поста и для другого пользователя"""
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        self.post.text = 'Новый текст'
+        self.post.save()
+        authorized_client = Client()
+        authorized_client.force_login(self.author)
+        for client in (self.guest_client, authorized_client):
+            for url in self.urls:
+                with self.subTest(url=url):
+                    response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class ShellCacheViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    def test_personal_fragments_filled_per_request(self):
+        """Одна закешированная страница поста, а шапка, ссылка
+        редактирования и форма комментария у каждого свои"""
+        cache.clear()
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        author_client = Client()
+        author_client.force_login(ShellCacheViewsTest.author)
+        reader_client = Client()
+        reader_client.force_login(ShellCacheViewsTest.reader)
+        cases = (
+            (Client(), {'Войти': True, 'редактировать запись': False,
+                        'Добавить комментарий': False}),
+            (author_client, {'Пользователь: author': True,
+                             'редактировать запись': True,
+                             'Добавить комментарий': True}),
+            (reader_client, {'Пользователь: reader': True,
+                             'редактировать запись': False,
+                             'Добавить комментарий': True}),
+        )
+        for client, expected in cases:
+            response = client.get(url)
+            self.assertNotContains(response, '<!--hole:')
+            for text, present in expected.items():
+                with self.subTest(text=text):
+                    self.assertEqual(text in response.content.decode(),
+                                     present)
+        # Страница не рендерится заново: ETag, сессия и пользователь
+        with self.assertNumQueries(3):
+            reader_client.get(url)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Текст №1')
+
+    def setUp(self):
+        cache.clear()
+
+    def render_card(self):
+        post = Post.objects.select_related('author').get(
+            pk=PostCardCacheTest.post.pk)
+        return render_to_string('posts/includes/post.html', {'post': post})
+
+    def test_post_card_cached_until_post_or_author_changes(self):
+        """Карточка берется из кеша, пока не изменятся пост или автор"""
+        self.assertIn('Текст №1', self.render_card())
+        Post.objects.filter(pk=PostCardCacheTest.post.pk).update(
+            text='Текст без сигналов')
+        self.assertIn('Текст №1', self.render_card())
+        post = Post.objects.get(pk=PostCardCacheTest.post.pk)
+        post.text = 'Отредактированный текст'
+        post.save()
+        self.assertIn('Отредактированный текст', self.render_card())
+        PostCardCacheTest.author.first_name = 'Новое имя'
+        PostCardCacheTest.author.save()
+        self.assertIn('Новое имя', self.render_card())
+
+
+class CommentsViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = Client()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Текст №1',
+        )
+        for i in range(15):
+            Comment.objects.create(
+                author=User.objects.create_user(username=f'user{i}'),
+                post=cls.post,
+                text=f'Коммент №{i}',
+            )
+
+    def test_comments_are_loaded_by_cursor(self):
+        """Комментарии отдаются порциями по курсору за постоянное
+        число запросов"""
+        url = reverse('posts:api_comments',
+                      kwargs={'post_id': CommentsViewTest.post.id})
+        # Проверка поста и сами комментарии
+        with self.assertNumQueries(2):
+            response = CommentsViewTest.client.get(url)
+            first = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(first['results'][0]['text'], 'Коммент №14')
+        self.assertEqual(first['results'][0]['author'], 'user14')
+        response = CommentsViewTest.client.get(url, {'cursor': first['next']})
+        second = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+
+    def test_post_detail_renders_first_comments(self):
+        """Страница поста рендерит только первую порцию комментариев,
+        остальные подгружаются по курсору"""
+        # ETag, пост и первая порция комментариев
+        with self.assertNumQueries(3):
+            response = CommentsViewTest.client.get(reverse(
+                'posts:post_detail',
+                kwargs={'post_id': CommentsViewTest.post.id}))
+        self.assertContains(response, 'Комментарии: 15')
+        self.assertContains(response, 'Коммент №14')
+        self.assertContains(response, 'Коммент №5')
+        self.assertNotContains(response, 'Коммент №4<')
+        self.assertContains(
+            response, f'data-next="{response.context["comments"].next_cursor}"'
+        )
+        self.assertContains(response, '/profile/%7Busername%7D/')
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего поста - 404"""
+        response = CommentsViewTest.client.get(
+            reverse('posts:api_comments', kwargs={'post_id': 10 ** 6})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
 
-class FollowViewTest(TestCase):
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = Client()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Пост про кошек')
+        Post.objects.create(author=cls.author, text='Пост про собак')
+
+    def found(self, query):
+        response = SearchViewTest.client.get(reverse('posts:search'),
+                                             {'q': query})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_follows_post_text(self):
+        """Поиск находит посты и следит за изменением их текста"""
+        self.assertEqual(self.found('кошек'), ['Пост про кошек'])
+        self.assertEqual(self.found('"кошек OR'), [])
+        post = SearchViewTest.post
+        post.text = 'Пост про попугаев'
+        post.save()
+        self.assertEqual(self.found('кошек'), [])
+        self.assertEqual(self.found('попугаев'), ['Пост про попугаев'])
+        post.delete()
+        self.assertEqual(self.found('попугаев'), [])
+
+
+class FollowViewTest(WarmGroupsMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -265,16 +839,121 @@ class FollowViewTest(TestCase):
         пользователей и удалять их из подписок"""
         first_follow_count = Follow.objects.count()
         (FollowViewTest.authorized_user.
-         get(reverse('posts:profile_follow',
-                     kwargs={'username': FollowViewTest.second_author})))
+         post(reverse('posts:profile_follow',
+                      kwargs={'username': FollowViewTest.second_author})))
         second_follow_count = Follow.objects.count()
         self.assertEqual(first_follow_count + 1, second_follow_count)
         (FollowViewTest.authorized_user.
-         get(reverse('posts:profile_unfollow',
-                     kwargs={'username': FollowViewTest.second_author})))
+         post(reverse('posts:profile_unfollow',
+                      kwargs={'username': FollowViewTest.second_author})))
         third_follow_count = Follow.objects.count()
         self.assertEqual(third_follow_count + 1, second_follow_count)
 
+    def test_follow_is_idempotent_and_answers_xhr(self):
+        """Повторная подписка и отписка ничего не меняют, XHR получает
+        JSON вместо редиректа"""
+        url = reverse('posts:profile_follow',
+                      kwargs={'username': FollowViewTest.second_author})
+        unfollow_url = reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': FollowViewTest.second_author},
+        )
+        client = FollowViewTest.authorized_user
+        responses = [
+            client.post(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+            for _ in range(2)
+        ]
+        self.assertEqual(responses, [{'following': True, 'changed': True},
+                                     {'following': True, 'changed': False}])
+        counter = UserCounter.objects.get(user=FollowViewTest.second_author)
+        self.assertEqual(counter.followers_count, 1)
+        response = client.post(unfollow_url,
+                               HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(),
+                         {'following': False, 'changed': True})
+        self.assertRedirects(
+            client.post(unfollow_url),
+            reverse('posts:profile',
+                    kwargs={'username': FollowViewTest.second_author}),
+        )
+        counter.refresh_from_db()
+        self.assertEqual(counter.followers_count, 0)
+
+    def test_profile_follow_status_in_author_query(self):
+        """Статус подписки проверяется одним EXISTS по id автора,
+        аноним не подписан"""
+        url = reverse('posts:profile',
+                      kwargs={'username': FollowViewTest.author})
+        # ETag, автор со счетчиками, COUNT(*) и посты
+        with self.assertNumQueries(4):
+            response = Client().get(url)
+        self.assertIs(response.context['following'], False)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        # ETag, сессия, пользователь и EXISTS подписки
+        with CaptureQueriesContext(connection) as queries:
+            response = FollowViewTest.authorized_user.get(url)
+        self.assertEqual(len(queries), 4)
+        self.assertIs(response.context['following'], True)
+        follow_query = queries[-1]['sql']
+        self.assertIn('"posts_follow"."author_id" =', follow_query)
+        self.assertNotIn('JOIN', follow_query)
+
+    def test_profile_shell_shared_with_authorized_users(self):
+        """Вошедший пользователь получает закешированную для анонима
+        страницу, персонально рендерится только кнопка подписки"""
+        url = reverse('posts:profile',
+                      kwargs={'username': FollowViewTest.author})
+        cases = (
+            # ETag, автор со счетчиками, COUNT(*) и посты
+            (Client(), False, 4, 'Войти'),
+            # ETag, сессия, пользователь и EXISTS подписки
+            (FollowViewTest.authorized_user, True, 4, 'Отписаться'),
+        )
+        for client, following, queries, text in cases:
+            with self.subTest(following=following):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertIs(response.context['following'], following)
+                self.assertContains(response, text)
+                self.assertContains(response, 'Текст №1')
+
+    def test_follow_self_or_missing_author(self):
+        """Подписка на себя и на несуществующего автора не создается"""
+        count = Follow.objects.count()
+        for username in (FollowViewTest.user.username, 'missing'):
+            with self.subTest(username=username):
+                FollowViewTest.authorized_user.post(reverse(
+                    'posts:profile_follow', kwargs={'username': username}))
+                self.assertEqual(Follow.objects.count(), count)
+
+    def test_follow_self_or_missing_author_responses(self):
+        """Несуществующий автор - 404, на себя подписки нет"""
+        client = FollowViewTest.authorized_user
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                response = client.post(reverse(
+                    f'posts:{name}', kwargs={'username': 'missing'}))
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = client.post(
+            reverse('posts:profile_follow',
+                    kwargs={'username': FollowViewTest.user.username}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json(),
+                         {'following': False, 'changed': False})
+
+    def test_follow_requires_post(self):
+        """GET не меняет подписки"""
+        count = Follow.objects.count()
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                response = FollowViewTest.authorized_user.get(reverse(
+                    f'posts:{name}',
+                    kwargs={'username': FollowViewTest.author}))
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.METHOD_NOT_ALLOWED)
+                self.assertEqual(Follow.objects.count(), count)
+
     def test_(self):
         """Новая запись пользователя появляется в ленте тех, кто на него
         подписан и не появляется в ленте тех, кто не подписан."""
@@ -297,3 +976,116 @@ class FollowViewTest(TestCase):
         self.assertEqual(old_posts_count_user + 1, new_posts_count_user)
         self.assertEqual(old_posts_count_second_user,
                          new_posts_count_second_user)
+
+
+@override_settings(FOLLOW_TIMELINE=True, TIMELINE_LENGTH=2)
+class TimelineViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        cls.authorized_user = Client()
+        cls.authorized_user.force_login(cls.user)
+        for i in range(3):
+            Post.objects.create(author=cls.author, text=f'Текст №{i}')
+
+    def follow_page(self):
+        response = TimelineViewTest.authorized_user.get(
+            reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_timeline_follows_subscriptions(self):
+        """Лента заполняется при подписке, пополняется новыми постами,
+        обрезается до TIMELINE_LENGTH и очищается при отписке."""
+        profile_kwargs = {'username': TimelineViewTest.author}
+        TimelineViewTest.authorized_user.post(
+            reverse('posts:profile_follow', kwargs=profile_kwargs))
+        self.assertEqual(self.follow_page(), ['Текст №2', 'Текст №1'])
+        Post.objects.create(author=TimelineViewTest.author, text='Новый')
+        self.assertEqual(self.follow_page(), ['Новый', 'Текст №2'])
+        TimelineViewTest.authorized_user.post(
+            reverse('posts:profile_unfollow', kwargs=profile_kwargs))
+        self.assertEqual(self.follow_page(), [])
+
+    def test_fan_out_trims_all_timelines_at_once(self):
+        """Новый пост обрезает ленты всех подписчиков одним DELETE"""
+        followers = [User.objects.create_user(username=f'follower{i}')
+                     for i in range(3)]
+        for follower in followers:
+            Follow.objects.create(user=follower,
+                                  author=TimelineViewTest.author)
+        with CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(author=TimelineViewTest.author,
+                                       text='Новый')
+        deletes = [query for query in queries
+                   if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 1)
+        for follower in followers:
+            with self.subTest(follower=follower):
+                entries = TimelineEntry.objects.filter(user=follower)
+                self.assertEqual(entries.count(), 2)
+                self.assertTrue(entries.filter(post=post).exists())
+
+    def test_timeline_ordered_by_entries(self):
+        """Страница ленты сортируется по колонкам записей ленты"""
+        Follow.objects.create(user=TimelineViewTest.user,
+                              author=TimelineViewTest.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.follow_page(), ['Текст №2', 'Текст №1'])
+        page_query = queries[-1]['sql']
+        self.assertIn('ORDER BY "timeline_date" DESC, "timeline_post" DESC',
+                      page_query)
+
+
+class ExportViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост, с запятой'
+        )
+        Comment.objects.create(author=cls.author, post=cls.post,
+                               text='Комментарий')
+        cls.url = reverse('posts:profile_export',
+                          kwargs={'username': cls.author})
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(ExportViewTest.author)
+
+    def test_export_ndjson_with_comments(self):
+        """NDJSON содержит пост и, по запросу, комментарий"""
+        response = self.author_client.get(ExportViewTest.url,
+                                          {'comments': '1'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['kind'] for row in rows], ['post', 'comment'])
+        self.assertEqual(rows[0]['group'], 'group')
+        self.assertEqual(rows[1]['post'], ExportViewTest.post.id)
+
+    def test_export_csv(self):
+        """CSV начинается с заголовка и экранирует запятые"""
+        response = self.author_client.get(ExportViewTest.url,
+                                          {'format': 'csv'})
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(rows[0][:4], ['kind', 'id', 'pub_date', 'text'])
+        self.assertEqual(rows[1][3], 'Пост, с запятой')
+        self.assertEqual(len(rows), 2)
+
+    def test_export_forbidden_for_other_users(self):
+        """Чужую выгрузку получают только модераторы"""
+        other = User.objects.create_user(username='other')
+        client = Client()
+        client.force_login(other)
+        self.assertEqual(client.get(ExportViewTest.url).status_code,
+                         HTTPStatus.FORBIDDEN)
+        other.is_staff = True
+        other.save()
+        self.assertEqual(client.get(ExportViewTest.url).status_code,
+                         HTTPStatus.OK)
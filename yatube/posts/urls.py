@@ -1,13 +1,22 @@
 from django.urls import path
 
-from posts import views
+from posts import api, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('fragment/', views.index_fragment, name='index_fragment'),
     path('group/<slug>/', views.group_posts, name='group_list'),
+    path('group/<slug>/fragment/',
+         views.group_fragment,
+         name='group_fragment'
+         ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/fragment/',
+         views.profile_fragment,
+         name='profile_fragment'
+         ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
@@ -15,7 +24,9 @@ urlpatterns = [
          views.add_comment,
          name='add_comment'
          ),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/fragment/', views.follow_fragment, name='follow_fragment'),
     path('profile/<str:username>/follow/',
          views.profile_follow,
          name='profile_follow'
@@ -24,4 +35,20 @@ urlpatterns = [
          views.profile_unfollow,
          name='profile_unfollow'
          ),
+    path('profile/<str:username>/export/',
+         views.profile_export,
+         name='profile_export'
+         ),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'),
+    path('api/posts/<int:post_id>/comments/',
+         api.comments,
+         name='api_comments'
+         ),
+    path('api/group/<slug>/posts/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/posts/',
+         api.profile,
+         name='api_profile'
+         ),
+    path('api/follow/posts/', api.follow_index, name='api_follow_index'),
 ]
@@ -1,70 +1,126 @@
+from urllib.parse import urlencode
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db import router, transaction
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 
+from core.cache import cache_shell, shell_condition
+from core.routers import read_from_replica
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post
-from posts.includes.follow import follow
-from posts.includes.paginator import paginator
+from posts.models import Post
+from posts.includes import groups
+from posts.includes.conditional import (group_etag, index_etag, post_etag,
+                                        profile_etag)
+from posts.includes.export import FORMATS, export
+from posts.includes.feed import FEED_VERSION, feed
+from posts.includes.follow import subscribe, unsubscribe
+from posts.includes.groups import with_groups
+from posts.includes.paginator import (ORDER, CursorPaginator,
+                                      WindowPaginator, paginator)
+from posts.includes.search import search as search_posts
+from posts.includes.thumbnails import schedule
+from posts.includes.timeline import posts_for
 
 User = get_user_model()
 
 
 # Главная страница
-@cache_page(20, key_prefix='index_page')
+@read_from_replica
+@shell_condition(index_etag)
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'index_page', FEED_VERSION)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
+    post_list = feed(Post.objects.all())
     page_obj = paginator(post_list, settings.PAGE_OBJ_COUNT, request)
     context = {
         'page_obj': page_obj,
+        'fragment_url': reverse('posts:index_fragment'),
     }
     return render(request, template, context)
 
 
 # Страница конкретного сообщества
+@read_from_replica
+@shell_condition(group_etag)
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'group_page', FEED_VERSION)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    group = groups.by_slug(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    post_list = feed(group.posts.all())
     page_obj = paginator(post_list, settings.PAGE_OBJ_COUNT, request)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'fragment_url': reverse('posts:group_fragment', args=[slug]),
     }
     return render(request, template, context)
 
 
 # Страница автора
+@read_from_replica
+@shell_condition(profile_etag)
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'profile_page', FEED_VERSION)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = get_object_or_404(User.objects.select_related('counter'),
+                               username=username)
+    post_list = feed(author.posts.all())
     page_obj = paginator(post_list, settings.PAGE_OBJ_COUNT, request)
-    following = follow(request, author)
     context = {
-        'following': following,
         'username': author,
         'page_obj': page_obj,
+        'fragment_url': reverse('posts:profile_fragment', args=[username]),
     }
     return render(request, template, context)
 
 
 # Страница поста
+@read_from_replica
+@shell_condition(post_etag)
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'post_page', FEED_VERSION)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
-    form = CommentForm(request.POST or None)
-    comment_list = post.comments.all()
-    page_obj = paginator(comment_list,
-                         settings.PAGE_OBJ_COUNT,
-                         request
-                         )
+    post = get_object_or_404(
+        with_groups(Post.objects.select_related('author__counter')),
+        id=post_id,
+    )
+    comments = CursorPaginator(
+        post.comments.select_related('author').only(
+            'post', 'text', 'pub_date', 'author__username'
+        ),
+        settings.PAGE_OBJ_COUNT,
+    ).get_page()
     context = {
         'post': post,
-        'form': form,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
+# Поиск по постам
+@read_from_replica
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    ids = search_posts(query, settings.SEARCH_LIMIT)
+    page_obj = WindowPaginator(ids, settings.PAGE_OBJ_COUNT).get_page(
+        request.GET.get('page')
+    )
+    posts = feed(Post.objects.all()).in_bulk(page_obj.object_list)
+    page_obj.object_list = [posts[pk] for pk in page_obj.object_list
+                            if pk in posts]
+    context = {
+        'query': query,
+        'page_query': urlencode({'q': query}) + '&',
         'page_obj': page_obj,
     }
     return render(request, template, context)
@@ -72,6 +128,7 @@ def post_detail(request, post_id):
 
 # Страница созадния поста
 @login_required
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(request.POST or None,
@@ -81,12 +138,14 @@ def post_create(request):
         post = form.save(commit=False)
         post.author_id = request.user.id
         post.save()
+        schedule(post.image)
         return redirect('posts:profile', request.user)
     return render(request, template, {'form': form})
 
 
 # Страница редактирования поста
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, id=post_id)
@@ -98,6 +157,8 @@ def post_edit(request, post_id):
                     )
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            schedule(post.image)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -107,6 +168,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -118,29 +180,130 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = (Post.objects.filter(author__following__user=request.user))
-    page_obj = paginator(post_list, settings.PAGE_OBJ_COUNT, request)
+    post_list, order = posts_for(request.user)
+    page_obj = paginator(feed(post_list), settings.PAGE_OBJ_COUNT, request,
+                         order=order)
     context = {
         'page_obj': page_obj,
+        'fragment_url': reverse('posts:follow_fragment'),
     }
     return render(request, template, context)
 
 
+def _fragment(request, post_list, fragment_url, grouptrue=True,
+              order=ORDER):
+    """Следующая порция ленты по курсору: только карточки постов, без
+    base.html. Ее подгружает static/js/feed.js при прокрутке."""
+    page_obj = CursorPaginator(
+        feed(post_list), settings.PAGE_OBJ_COUNT, order
+    ).get_page(request.GET.get('cursor'))
+    context = {
+        'page_obj': page_obj,
+        'fragment_url': fragment_url,
+        'grouptrue': grouptrue,
+        'continued': True,
+    }
+    return render(request, 'posts/includes/feed.html', context)
+
+
+@read_from_replica
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'index_fragment', FEED_VERSION)
+def index_fragment(request):
+    return _fragment(request, Post.objects.all(),
+                     reverse('posts:index_fragment'))
+
+
+@read_from_replica
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'group_fragment', FEED_VERSION)
+def group_fragment(request, slug):
+    group = groups.by_slug(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    return _fragment(request, Post.objects.filter(group=group),
+                     reverse('posts:group_fragment', args=[slug]),
+                     grouptrue=False)
+
+
+@read_from_replica
+@cache_shell(settings.PAGE_CACHE_TIMEOUT, 'profile_fragment', FEED_VERSION)
+def profile_fragment(request, username):
+    return _fragment(request, Post.objects.filter(author__username=username),
+                     reverse('posts:profile_fragment', args=[username]))
+
+
 @login_required
-def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if author != request.user:
-        Follow.objects.get_or_create(
-            author=author,
-            user=request.user,
-        )
+@read_from_replica
+def follow_fragment(request):
+    post_list, order = posts_for(request.user)
+    return _fragment(request, post_list, reverse('posts:follow_fragment'),
+                     order=order)
+
+
+def _toggle_response(request, username, following, changed):
+    """XHR получает JSON без перерисовки профиля, обычная форма -
+    редирект на профиль."""
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'following': following, 'changed': changed})
     return redirect('posts:profile', username)
 
 
+def _author_id_or_404(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        raise Http404('Автор не найден')
+    return author_id
+
+
 @login_required
+@require_POST
+@transaction.atomic
+def profile_follow(request, username):
+    changed = subscribe(request.user.id, username) is not None
+    # Без изменений: подписка уже была, автора нет или это сам
+    # пользователь. Различаем только в этом случае, лишним запросом
+    following = changed or _author_id_or_404(username) != request.user.id
+    return _toggle_response(request, username, following, changed)
+
+
+@login_required
+@require_POST
+@transaction.atomic
 def profile_unfollow(request, username):
+    changed = unsubscribe(request.user.id, username) is not None
+    if not changed:
+        _author_id_or_404(username)
+    return _toggle_response(request, username, False, changed)
+
+
+# Выгрузка постов и комментариев автора потоком. Доступна самому
+# автору и модераторам
+@login_required
+@read_from_replica
+def profile_export(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author, user=request.user).delete()
-    return redirect('posts:profile', username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest(
+            f'Формат должен быть одним из: {", ".join(FORMATS)}'
+        )
+    lines = export(
+        author.id, export_format,
+        comments=bool(request.GET.get('comments')),
+        using=router.db_for_read(Post),
+    )
+    content_type = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv; charset=utf-8',
+    }[export_format]
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{author.username}.{export_format}"'
+    )
+    return response
@@ -0,0 +1,46 @@
+// Подгрузка комментариев к посту порциями по курсору
+(function () {
+  var container = document.getElementById('comments');
+  var more = document.getElementById('comments-more');
+  if (!container) {
+    return;
+  }
+  var profileUrl = container.dataset.profileUrl;
+  // Первую порцию страница уже отрисовала
+  var next = container.dataset.next || null;
+
+  function render(comment) {
+    var media = document.createElement('div');
+    media.className = 'media mb-4';
+    var body = document.createElement('div');
+    body.className = 'media-body';
+    var title = document.createElement('h5');
+    title.className = 'mt-0';
+    var link = document.createElement('a');
+    link.href = profileUrl.replace('%7Busername%7D', encodeURIComponent(comment.author));
+    link.textContent = comment.author;
+    var text = document.createElement('p');
+    text.textContent = comment.text;
+    title.appendChild(link);
+    body.appendChild(title);
+    body.appendChild(text);
+    media.appendChild(body);
+    container.appendChild(media);
+  }
+
+  function load() {
+    var url = container.dataset.url + '?cursor=' + encodeURIComponent(next);
+    more.disabled = true;
+    fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        data.results.forEach(render);
+        next = data.next;
+        more.hidden = !next;
+        more.disabled = false;
+      });
+  }
+
+  more.addEventListener('click', load);
+  more.hidden = !next;
+})();
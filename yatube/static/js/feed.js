@@ -0,0 +1,54 @@
+// Подгрузка ленты при прокрутке. Без скрипта работает обычная
+// постраничная навигация
+(function () {
+  var sentinel = document.querySelector('.js-feed-more');
+  if (!sentinel || !('IntersectionObserver' in window) || !window.fetch) {
+    return;
+  }
+  var pagination = document.querySelector('.js-feed-pagination');
+  var loading = false;
+
+  var observer = new IntersectionObserver(function (entries) {
+    if (entries[0].isIntersecting) {
+      load();
+    }
+  }, {rootMargin: '600px'});
+
+  function load() {
+    if (loading) {
+      return;
+    }
+    loading = true;
+    fetch(sentinel.dataset.url, {credentials: 'same-origin'})
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.status);
+        }
+        return response.text();
+      })
+      .then(function (html) {
+        var fragment = document.createElement('template');
+        fragment.innerHTML = html;
+        var next = fragment.content.querySelector('.js-feed-more');
+        observer.unobserve(sentinel);
+        sentinel.replaceWith(fragment.content);
+        if (next) {
+          sentinel = next;
+          observer.observe(sentinel);
+        }
+        loading = false;
+      })
+      .catch(function () {
+        // Без фрагмента возвращаем обычную навигацию
+        observer.disconnect();
+        if (pagination) {
+          pagination.hidden = false;
+        }
+      });
+  }
+
+  if (pagination) {
+    pagination.hidden = true;
+  }
+  observer.observe(sentinel);
+})();
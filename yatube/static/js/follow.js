@@ -0,0 +1,46 @@
+// Подписка и отписка без перезагрузки страницы профиля
+(function () {
+  var form = document.querySelector('form.js-follow');
+  if (!form) {
+    return;
+  }
+  var button = form.querySelector('button');
+  var counter = document.getElementById('followers-count');
+
+  function render(following) {
+    form.action = following ? form.dataset.unfollowUrl : form.dataset.followUrl;
+    button.textContent = following ? 'Отписаться' : 'Подписаться';
+    button.classList.toggle('btn-light', following);
+    button.classList.toggle('btn-primary', !following);
+  }
+
+  form.addEventListener('submit', function (event) {
+    event.preventDefault();
+    button.disabled = true;
+    fetch(form.action, {
+      method: 'POST',
+      body: new FormData(form),
+      headers: {'X-Requested-With': 'XMLHttpRequest'},
+      credentials: 'same-origin'
+    })
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.status);
+        }
+        return response.json();
+      })
+      .then(function (data) {
+        render(data.following);
+        if (data.changed && counter) {
+          counter.textContent = Number(counter.textContent) + (data.following ? 1 : -1);
+        }
+      })
+      .catch(function () {
+        // Без JSON откатываемся на обычную отправку формы
+        form.submit();
+      })
+      .then(function () {
+        button.disabled = false;
+      });
+  });
+})();
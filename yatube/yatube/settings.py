@@ -35,11 +35,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.StickyPrimaryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,13 +72,38 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 # Database
 
+# sqlite3 с WAL и PRAGMA из core.sqlite; соединение живет CONN_MAX_AGE
+# секунд и переиспользуется следующими запросами того же потока
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'timeout': 5,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Реплика для чтения лент; без DATABASE_REPLICA это второе соединение
+    # к тому же файлу, в тестах - зеркало default
+    'replica': {
+        'ENGINE': 'core.sqlite',
+        'NAME': os.getenv(
+            'DATABASE_REPLICA', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'timeout': 5},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Алиасы, с которых читают view с read_from_replica, и сколько секунд
+# после записи пользователь читает только с основной базы
+DATABASE_REPLICAS = ['replica'] if os.getenv('DATABASE_REPLICA') else []
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 
@@ -126,6 +153,39 @@ POSTS_SLICE = 15
 
 PAGE_OBJ_COUNT = 10
 
+# Реестр групп в памяти процесса перечитывается хотя бы раз в столько
+# секунд, даже если версия в кеше не менялась (LocMemCache не видит
+# правок из других процессов)
+GROUPS_REGISTRY_TIMEOUT = 60
+
+# Приблизительные COUNT(*) для больших таблиц: с какого размера таблицы
+# верить статистике СУБД и сколько секунд кешировать точный подсчет
+ESTIMATE_COUNT_FROM = 100000
+COUNT_CACHE_TIMEOUT = 60
+# Через сколько секунд снова искать статистику, если ее не было
+# (sqlite_stat1 появляется после ANALYZE)
+STATISTICS_RETRY_TIMEOUT = 10 * 60
+
+# Наибольший размер страницы JSON API (?limit=)
+API_MAX_LIMIT = 1000
+
+# Сколько самых релевантных постов выдает поиск
+SEARCH_LIMIT = 1000
+
+# Keyset-пагинация лент по (pub_date, id) вместо номеров страниц
+CURSOR_PAGINATION = False
+
+# Материализованная лента подписок (fan-out при публикации поста).
+# После включения заполняется командой rebuild_timeline
+FOLLOW_TIMELINE = False
+TIMELINE_LENGTH = 1000
+
+# Заголовок Server-Timing и JSON-строка в логгер core.profiling на каждый
+# запрос; доля запросов от 0 до 1 дополнительно профилируется cProfile
+SERVER_TIMING = os.getenv('SERVER_TIMING') == '1'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 
@@ -134,6 +194,25 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Миниатюры изображений постов создаются в фоне: размер -> (геометрия, опции)
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'padding': True, 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2
+
+# Кеш страниц лент сбрасывается сигналами, поэтому может жить долго
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Сколько секунд после истечения или сброса версии отдавать устаревшую
+# страницу, пока один процесс ее пересчитывает; на сколько секунд
+# берется блокировка пересчета; сколько секунд при пустом кеше ждать
+# значения от взявшего блокировку, прежде чем считать самому;
+# коэффициент досрочного пересчета (0 - выключен, больше 1 -
+# пересчитывать раньше)
+CACHE_STALE_TIMEOUT = 10 * 60
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 3
+CACHE_EARLY_BETA = 1.0
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',